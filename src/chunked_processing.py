@@ -0,0 +1,370 @@
+"""
+チャンク処理スクリプト
+
+長時間の記録（数時間分のランドマーク配列）を、メモリマップした .npy ファイルから
+一定フレーム数ずつ読み込んで後処理します。
+utils の smooth_landmarks / interpolate_missing_frames / calculate_velocity と
+同じ結果を、記録の長さではなくチャンクサイズで決まるメモリ量で計算します。
+"""
+
+import argparse
+import shutil
+import numpy as np
+from pathlib import Path
+from typing import List, Tuple
+from scipy import interpolate
+from scipy.ndimage import gaussian_filter1d
+
+
+# 1チャンクあたりのフレーム数（33点×3座標×float64で1チャンク約40MB）
+# 作業メモリのピークはチャンクの数倍になる（実測: 速度計算 約40MB、
+# スムージング 約80MB（重なり分の読み込み + フィルタ出力）、補間 約200MB（interp1d の中間配列））
+DEFAULT_CHUNK_SIZE = 50000
+
+
+class LandmarkArrayWriter:
+    """
+    キャプチャ中のランドマークを1フレームずつ .npy ファイルに書き出すクラス
+
+    フレーム数は書き終わるまで分からないため、座標はいったん一時ファイル
+    （<path>.part）に追記し、close() で .npy のヘッダーを付けて保存します。
+    メモリに保持するのは1フレーム分だけです。
+    検出できなかったフレームは全座標ゼロで保存します
+    （find_valid_frames_chunked で欠損フレームとして扱われます）。
+    """
+
+    def __init__(self, path: str, num_landmarks: int = 33, dtype=np.float64):
+        """
+        初期化
+
+        Args:
+            path: 出力 .npy ファイルのパス
+            num_landmarks: 1フレームあたりのランドマーク数
+            dtype: データ型
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.num_landmarks = num_landmarks
+        self.dtype = np.dtype(dtype)
+        self.frame_count = 0
+
+        self._part_path = self.path.with_name(self.path.name + '.part')
+        self._part_file = open(self._part_path, 'wb')
+        self._empty_frame = np.zeros((num_landmarks, 3), dtype=self.dtype).tobytes()
+
+    def write(self, landmarks: np.ndarray = None) -> None:
+        """
+        1フレーム分のランドマークを追記
+
+        Args:
+            landmarks: (landmarks, 3) の形状の配列（Noneの場合は欠損フレーム）
+        """
+        if landmarks is None:
+            self._part_file.write(self._empty_frame)
+        else:
+            landmarks = np.ascontiguousarray(landmarks, dtype=self.dtype)
+            if landmarks.shape != (self.num_landmarks, 3):
+                raise ValueError(
+                    f"ランドマークの形状が不正です: {landmarks.shape}"
+                )
+            self._part_file.write(landmarks.tobytes())
+        self.frame_count += 1
+
+    def close(self) -> Path:
+        """
+        .npy ファイルとして保存し、一時ファイルを削除
+
+        Returns:
+            出力 .npy ファイルのパス
+        """
+        self._part_file.close()
+
+        header = {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (self.frame_count, self.num_landmarks, 3),
+        }
+        with open(self.path, 'wb') as f:
+            np.lib.format.write_array_header_1_0(f, header)
+            with open(self._part_path, 'rb') as part:
+                shutil.copyfileobj(part, f, 16 * 1024 * 1024)
+        self._part_path.unlink()
+
+        return self.path
+
+
+def open_output(path: str, shape: Tuple[int, ...], dtype=np.float64) -> np.ndarray:
+    """
+    出力用のメモリマップ配列（.npy形式）を作成
+
+    Args:
+        path: 出力 .npy ファイルのパス
+        shape: 配列の形状
+        dtype: データ型
+
+    Returns:
+        書き込み可能なメモリマップ配列
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    return np.lib.format.open_memmap(str(path), mode='w+', dtype=dtype, shape=shape)
+
+
+def find_valid_frames_chunked(landmarks_sequence: np.ndarray,
+                              chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[int]:
+    """
+    ランドマークが検出されたフレームを探す（全座標がゼロのフレームを欠損とみなす）
+
+    Args:
+        landmarks_sequence: (frames, landmarks, 3) の形状の配列（メモリマップ可）
+        chunk_size: 1チャンクあたりのフレーム数
+
+    Returns:
+        有効なフレームのインデックスリスト
+    """
+    valid_frames = []
+
+    for start in range(0, len(landmarks_sequence), chunk_size):
+        chunk = np.asarray(landmarks_sequence[start:start + chunk_size])
+        detected = np.any(chunk != 0, axis=(1, 2))
+        valid_frames.extend((np.flatnonzero(detected) + start).tolist())
+
+    return valid_frames
+
+
+def smooth_landmarks_chunked(landmarks_sequence: np.ndarray,
+                             sigma: float = 2.0,
+                             out: np.ndarray = None,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    ランドマーク座標系列をチャンクごとにスムージング
+
+    各チャンクの前後にガウシアンカーネルの半径分のフレームを重ねて読み込むため、
+    smooth_landmarks と同一の結果になります。
+
+    Args:
+        landmarks_sequence: (frames, landmarks, 3) の形状の配列（メモリマップ可）
+        sigma: ガウシアンフィルタのシグマ値
+        out: 出力先の配列（Noneの場合はメモリ上に確保）
+        chunk_size: 1チャンクあたりのフレーム数
+
+    Returns:
+        スムージングされた座標配列
+    """
+    if out is None:
+        out = np.empty_like(landmarks_sequence)
+
+    total_frames = len(landmarks_sequence)
+    # gaussian_filter1d（truncate=4.0）のカーネル半径
+    radius = int(4.0 * sigma + 0.5)
+
+    for start in range(0, total_frames, chunk_size):
+        stop = min(start + chunk_size, total_frames)
+
+        # カーネル半径分の重なりを含めて読み込む（記録の端では reflect が効く）
+        read_start = max(start - radius, 0)
+        read_stop = min(stop + radius, total_frames)
+        window = np.asarray(landmarks_sequence[read_start:read_stop])
+
+        smoothed = gaussian_filter1d(window, sigma=sigma, axis=0)
+        out[start:stop] = smoothed[start - read_start:stop - read_start]
+
+    return out
+
+
+def interpolate_missing_frames_chunked(landmarks_sequence: np.ndarray,
+                                       valid_frames: List[int],
+                                       out: np.ndarray = None,
+                                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    欠損フレームをチャンクごとに線形補間
+
+    各チャンクの補間には、チャンクをまたぐ欠損区間の両端の有効フレームも使うため、
+    interpolate_missing_frames と同一の結果になります。
+
+    Args:
+        landmarks_sequence: (frames, landmarks, 3) の形状の配列（メモリマップ可）
+        valid_frames: 有効なフレームのインデックスリスト（昇順）
+        out: 出力先の配列（Noneの場合はメモリ上に確保）
+        chunk_size: 1チャンクあたりのフレーム数
+
+    Returns:
+        補間された座標配列
+    """
+    if out is None:
+        out = np.empty_like(landmarks_sequence)
+
+    total_frames = len(landmarks_sequence)
+    valid_frames = np.asarray(valid_frames)
+
+    if len(valid_frames) < 2:
+        for start in range(0, total_frames, chunk_size):
+            out[start:start + chunk_size] = landmarks_sequence[start:start + chunk_size]
+        return out
+
+    for start in range(0, total_frames, chunk_size):
+        stop = min(start + chunk_size, total_frames)
+
+        # チャンク内の各フレームを挟む有効フレームの範囲
+        # （interp1d と同じく両端は最初・最後の2点で外挿）
+        first = np.clip(np.searchsorted(valid_frames, start), 1, len(valid_frames) - 1)
+        last = np.clip(np.searchsorted(valid_frames, stop - 1), 1, len(valid_frames) - 1)
+        neighbors = valid_frames[first - 1:last + 1]
+
+        f = interpolate.interp1d(
+            neighbors,
+            np.asarray(landmarks_sequence[neighbors]),
+            kind='linear',
+            axis=0,
+            fill_value='extrapolate'
+        )
+        out[start:stop] = f(np.arange(start, stop))
+
+    return out
+
+
+def calculate_velocity_chunked(landmarks_sequence: np.ndarray, fps: float,
+                               out: np.ndarray = None,
+                               chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    各ランドマークの速度をチャンクごとに計算
+
+    Args:
+        landmarks_sequence: (frames, landmarks, 3) の形状の配列（メモリマップ可）
+        fps: フレームレート
+        out: 出力先の配列 (frames-1, landmarks, 3)（Noneの場合はメモリ上に確保）
+        chunk_size: 1チャンクあたりのフレーム数
+
+    Returns:
+        速度配列 (frames-1, landmarks, 3)
+    """
+    total_frames = len(landmarks_sequence)
+    if out is None:
+        out = np.empty(
+            (max(total_frames - 1, 0),) + landmarks_sequence.shape[1:],
+            dtype=np.result_type(landmarks_sequence.dtype, 1.0)
+        )
+
+    dt = 1.0 / fps
+
+    for start in range(0, total_frames - 1, chunk_size):
+        stop = min(start + chunk_size, total_frames - 1)
+
+        # 次のチャンクの先頭フレームを1つ重ねて差分を取る
+        window = np.asarray(landmarks_sequence[start:stop + 1])
+        out[start:stop] = np.diff(window, axis=0) / dt
+
+    return out
+
+
+def process_landmarks_file(input_path: str, output_dir: str, fps: float,
+                           sigma: float = 2.0,
+                           valid_frames: List[int] = None,
+                           chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    .npy ファイルのランドマーク配列を 補間 → スムージング → 速度計算 の順に処理
+
+    各ステップの結果は output_dir に .npy として書き出し、次のステップは
+    それをメモリマップで読み込みます。
+
+    Args:
+        input_path: (frames, landmarks, 3) の配列を保存した .npy ファイルのパス
+        output_dir: 出力ディレクトリ
+        fps: フレームレート
+        sigma: ガウシアンフィルタのシグマ値
+        valid_frames: 有効なフレームのインデックスリスト（Noneの場合は自動検出）
+        chunk_size: 1チャンクあたりのフレーム数
+
+    Returns:
+        各ステップの出力ファイルのパスを含む辞書
+    """
+    input_path = Path(input_path)
+    output_dir = Path(output_dir)
+    landmarks_sequence = np.load(str(input_path), mmap_mode='r')
+
+    if valid_frames is None:
+        valid_frames = find_valid_frames_chunked(landmarks_sequence, chunk_size)
+
+    paths = {
+        "interpolated": output_dir / f"{input_path.stem}_interpolated.npy",
+        "smoothed": output_dir / f"{input_path.stem}_smoothed.npy",
+        "velocity": output_dir / f"{input_path.stem}_velocity.npy",
+    }
+
+    interpolated = open_output(
+        paths["interpolated"], landmarks_sequence.shape, landmarks_sequence.dtype
+    )
+    interpolate_missing_frames_chunked(
+        landmarks_sequence, valid_frames, out=interpolated, chunk_size=chunk_size
+    )
+    interpolated.flush()
+
+    smoothed = open_output(paths["smoothed"], interpolated.shape, interpolated.dtype)
+    smooth_landmarks_chunked(
+        interpolated, sigma=sigma, out=smoothed, chunk_size=chunk_size
+    )
+    smoothed.flush()
+
+    velocity = open_output(
+        paths["velocity"],
+        (max(len(smoothed) - 1, 0),) + smoothed.shape[1:],
+        np.result_type(smoothed.dtype, 1.0)
+    )
+    calculate_velocity_chunked(smoothed, fps, out=velocity, chunk_size=chunk_size)
+    velocity.flush()
+
+    return paths
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description='長時間記録のランドマーク配列をチャンクごとに後処理'
+    )
+    parser.add_argument(
+        '-i', '--input',
+        required=True,
+        help='入力 .npy ファイルのパス（(frames, 33, 3) の配列）'
+    )
+    parser.add_argument(
+        '-o', '--output-dir',
+        default='output',
+        help='出力ディレクトリ（デフォルト: output）'
+    )
+    parser.add_argument(
+        '--fps',
+        type=float,
+        required=True,
+        help='フレームレート'
+    )
+    parser.add_argument(
+        '--sigma',
+        type=float,
+        default=2.0,
+        help='ガウシアンフィルタのシグマ値（デフォルト: 2.0）'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'1チャンクあたりのフレーム数（デフォルト: {DEFAULT_CHUNK_SIZE}）'
+    )
+
+    args = parser.parse_args()
+
+    paths = process_landmarks_file(
+        input_path=args.input,
+        output_dir=args.output_dir,
+        fps=args.fps,
+        sigma=args.sigma,
+        chunk_size=args.chunk_size
+    )
+
+    print(f"\nチャンク処理完了!")
+    for name, path in paths.items():
+        print(f"  - {name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
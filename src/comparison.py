@@ -0,0 +1,472 @@
+"""
+動作比較スクリプト
+
+お手本の動作（リファレンス）と新しく撮影した動作をDTW（動的時間伸縮法）で
+時間方向に位置合わせし、関節ごとのズレを時系列で出力します。
+テンポが異なる動作同士でも、対応するフレーム同士を比較できます。
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, Tuple
+
+from utils import (
+    calculate_joint_angle_series,
+    fill_undefined_frames,
+    get_landmark_names,
+    get_major_joint_angles,
+    interpolate_missing_frames,
+    landmarks_to_array,
+)
+
+
+# バンド半径の上限（フレーム数）。経路復元用のメモリは frames × (2×半径+1) バイト
+MAX_BAND_RADIUS = 500
+
+
+def dtw_align(reference: np.ndarray, capture: np.ndarray,
+              radius: int = None) -> Tuple[np.ndarray, float]:
+    """
+    バンド制約付きDTWで2つの特徴量系列を位置合わせ
+
+    Sakoe-Chibaバンド（対角線から半径 radius フレーム以内）のみを計算します。
+    1行分の計算はNumPyでベクトル化しているため、Pythonのループは行数分だけです。
+    保持するのは1行分の累積コストと経路復元用の方向（1セル1バイト）のみで、
+    メモリ使用量は frames × バンド幅 に比例します。
+
+    Args:
+        reference: リファレンスの特徴量 (frames_ref, features)
+        capture: 比較対象の特徴量 (frames_cap, features)
+        radius: バンドの半径（フレーム数）。Noneの場合は長い方の系列の10%
+                （上限 MAX_BAND_RADIUS）
+
+    Returns:
+        ワーピングパス (steps, 2) [[reference_idx, capture_idx], ...] と
+        経路上の累積コスト（ユークリッド距離の合計）
+    """
+    reference = np.asarray(reference, dtype=np.float64).reshape(len(reference), -1)
+    capture = np.asarray(capture, dtype=np.float64).reshape(len(capture), -1)
+    n, m = len(reference), len(capture)
+    if n == 0 or m == 0:
+        raise ValueError("空の系列は位置合わせできません")
+
+    # バンドの中心は (0, 0) と (n-1, m-1) を結ぶ直線
+    slope = (m - 1) / (n - 1) if n > 1 else 0.0
+    if radius is None:
+        radius = min(int(0.1 * max(n, m)), MAX_BAND_RADIUS)
+    # 隣り合う行のバンドが必ず繋がるようにする
+    radius = max(int(radius), int(np.ceil(slope)), 1)
+    if n == 1:
+        radius = max(radius, m - 1)
+
+    centers = np.rint(np.arange(n) * slope).astype(np.int64)
+    band_lo = np.clip(centers - radius, 0, m - 1)
+    band_hi = np.clip(centers + radius, 0, m - 1)
+    band_width = 2 * radius + 1
+
+    # 経路復元用の方向 (0: 斜め, 1: 上 (i-1, j), 2: 左 (i, j-1))
+    directions = np.zeros((n, band_width), dtype=np.uint8)
+
+    prev_cost = np.zeros(1)
+    prev_lo, prev_hi = 0, -1
+
+    for i in range(n):
+        lo, hi = band_lo[i], band_hi[i]
+        length = hi - lo + 1
+
+        # このバンド内の局所コスト
+        local = np.sqrt(((capture[lo:hi + 1] - reference[i]) ** 2).sum(axis=1))
+
+        # 前の行の累積コストを j = lo-1 ... hi の範囲に並べる
+        shifted = np.full(length + 1, np.inf)
+        if i == 0:
+            shifted[0] = 0.0  # (-1, -1) にある仮想的な開始点
+        else:
+            start, stop = max(lo - 1, prev_lo), min(hi, prev_hi)
+            if start <= stop:
+                shifted[start - lo + 1:stop - lo + 2] = \
+                    prev_cost[start - prev_lo:stop - prev_lo + 1]
+        diag, up = shifted[:-1], shifted[1:]
+        from_up = up < diag
+        best_prev = np.where(from_up, up, diag)
+
+        # D[j] = local[j] + min(best_prev[j], D[j-1]) を累積和と累積最小で解く
+        # E[j] = D[j] - S[j] とおくと E[j] = min(best_prev[j] - S[j-1], E[j-1])
+        cumulative = np.cumsum(local)
+        candidate = best_prev - np.concatenate(([0.0], cumulative[:-1]))
+        relaxed = np.minimum.accumulate(candidate)
+        cost = relaxed + cumulative
+
+        step = np.where(from_up, 1, 0).astype(np.uint8)
+        step[relaxed < candidate] = 2
+        directions[i, :length] = step
+
+        prev_cost, prev_lo, prev_hi = cost, lo, hi
+
+    total_cost = float(prev_cost[m - 1 - prev_lo])
+
+    # 終点から方向をたどってワーピングパスを復元
+    path = []
+    i, j = n - 1, m - 1
+    while True:
+        path.append((i, j))
+        if i == 0 and j == 0:
+            break
+        step = directions[i, j - band_lo[i]]
+        if step == 0:
+            i, j = i - 1, j - 1
+        elif step == 1:
+            i -= 1
+        else:
+            j -= 1
+
+    return np.array(path[::-1], dtype=np.int64), total_cost
+
+
+def normalize_pose_sequence(landmarks_sequence: np.ndarray) -> np.ndarray:
+    """
+    各フレームの姿勢を正規化（重心を原点、最大距離を1）
+
+    utils.normalize_coordinates を全フレームに対してベクトル化したものです。
+
+    Args:
+        landmarks_sequence: (frames, landmarks, 3) の形状の配列
+
+    Returns:
+        正規化された座標配列
+    """
+    centered = landmarks_sequence - landmarks_sequence.mean(axis=1, keepdims=True)
+    scale = np.linalg.norm(centered, axis=2).max(axis=1)
+    scale[scale == 0] = 1.0
+
+    return centered / scale[:, None, None]
+
+
+class MotionComparator:
+    """リファレンス動作と撮影動作の比較クラス"""
+
+    FEATURES = ("angles", "pose")
+
+    def __init__(self, feature: str = "angles", radius: int = None):
+        """
+        初期化
+
+        Args:
+            feature: 位置合わせに使う特徴量
+                     "angles": 主要関節角度（get_major_joint_angles）
+                     "pose": 正規化した33点の3D座標
+            radius: DTWのバンド半径（フレーム数、Noneで自動）
+        """
+        if feature not in self.FEATURES:
+            raise ValueError(f"未対応の特徴量です: {feature}")
+
+        self.feature = feature
+        self.radius = radius
+        self.joint_definitions = get_major_joint_angles()
+
+    def load_sequence(self, json_path: str) -> Tuple[np.ndarray, dict]:
+        """
+        JSONファイルから3D座標系列を読み込み（欠損フレームは線形補間）
+
+        Args:
+            json_path: motion_capture.py が出力したJSONファイルのパス
+
+        Returns:
+            (frames, 33, 3) の座標配列とメタデータ
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            raise FileNotFoundError(f"JSONファイルが見つかりません: {json_path}")
+
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        landmarks_sequence, valid_frames = landmarks_to_array(data["frames"])
+        if len(valid_frames) < 2:
+            raise ValueError(
+                f"ランドマークが検出されたフレームが2つ未満です: {json_path}"
+            )
+        if len(valid_frames) < len(data["frames"]):
+            landmarks_sequence = interpolate_missing_frames(
+                landmarks_sequence, valid_frames
+            )
+
+        return landmarks_sequence, data["metadata"]
+
+    def extract_features(self,
+                         landmarks_sequence: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        位置合わせ用の特徴量を抽出
+
+        関節点が重なって角度が定義されないフレームは、直前のフレームの角度で埋めます。
+
+        Args:
+            landmarks_sequence: (frames, 33, 3) の形状の配列
+
+        Returns:
+            特徴量（angles: 関節角度 (frames, joints)、pose: 正規化座標 (frames, 33, 3)）と、
+            元の値が定義されなかったフレーム・関節を示すマスク (frames, joints)
+        """
+        if self.feature == "angles":
+            triplets = [definition[:3] for definition in self.joint_definitions]
+            angles = calculate_joint_angle_series(landmarks_sequence, triplets)
+            return fill_undefined_frames(angles), np.isnan(angles)
+
+        poses = normalize_pose_sequence(landmarks_sequence)
+        return poses, np.zeros(poses.shape[:2], dtype=bool)
+
+    def joint_names(self) -> list:
+        """
+        ズレを出力する関節名のリストを取得
+
+        Returns:
+            関節名のリスト
+        """
+        if self.feature == "angles":
+            return [definition[3] for definition in self.joint_definitions]
+
+        return get_landmark_names()
+
+    def compare(self, reference: np.ndarray, capture: np.ndarray) -> Dict:
+        """
+        2つの動作を位置合わせして関節ごとのズレを計算
+
+        Args:
+            reference: リファレンスの座標配列 (frames_ref, 33, 3)
+            capture: 撮影動作の座標配列 (frames_cap, 33, 3)
+
+        Returns:
+            以下を含む辞書
+                path: ワーピングパス (steps, 2)
+                distance: 経路上の累積コスト
+                normalized_distance: 1ステップあたりの平均コスト
+                path_deviation: 経路上の関節ごとのズレ (steps, joints)
+                frame_deviation: 撮影動作の各フレームでの関節ごとのズレ (frames_cap, joints)
+                                 （角度が定義されないフレームの関節はNaN）
+                joint_names: 関節名のリスト
+        """
+        reference_features, reference_undefined = self.extract_features(reference)
+        capture_features, capture_undefined = self.extract_features(capture)
+
+        # どちらかで一度も定義されない関節は位置合わせに使わない
+        usable = ~(reference_undefined.all(axis=0) | capture_undefined.all(axis=0))
+        if not usable.any():
+            raise ValueError("位置合わせに使える関節がありません")
+
+        path, distance = dtw_align(
+            reference_features[:, usable], capture_features[:, usable],
+            radius=self.radius
+        )
+
+        # 経路上の関節ごとのズレ（角度: 度、座標: 正規化後の距離）
+        diff = reference_features[path[:, 0]] - capture_features[path[:, 1]]
+        if self.feature == "angles":
+            path_deviation = np.abs(diff)
+        else:
+            path_deviation = np.linalg.norm(diff, axis=-1)
+
+        # 元の値が定義されなかった関節のズレは NaN にする
+        path_deviation[
+            reference_undefined[path[:, 0]] | capture_undefined[path[:, 1]]
+        ] = np.nan
+
+        # 撮影動作の各フレームに対応するステップの平均（NaNは除く）
+        num_frames = len(capture_features)
+        defined = ~np.isnan(path_deviation)
+        sums = np.stack([
+            np.bincount(path[:, 1], weights=column, minlength=num_frames)
+            for column in np.where(defined, path_deviation, 0.0).T
+        ], axis=1)
+        counts = np.stack([
+            np.bincount(path[:, 1], weights=column, minlength=num_frames)
+            for column in defined.T.astype(np.float64)
+        ], axis=1)
+        with np.errstate(invalid="ignore"):
+            frame_deviation = sums / counts
+
+        return {
+            "path": path,
+            "distance": distance,
+            "normalized_distance": distance / len(path),
+            "path_deviation": path_deviation,
+            "frame_deviation": frame_deviation,
+            "joint_names": self.joint_names(),
+        }
+
+    def save_result(self, result: Dict, output_path: str,
+                    reference_metadata: dict, capture_metadata: dict) -> None:
+        """
+        比較結果をJSONに保存
+
+        Args:
+            result: compare の戻り値
+            output_path: 出力JSONファイルのパス
+            reference_metadata: リファレンスのメタデータ
+            capture_metadata: 撮影動作のメタデータ
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        fps = capture_metadata["fps"]
+        joint_names = result["joint_names"]
+        output_data = {
+            "metadata": {
+                "reference_video": reference_metadata["video_name"],
+                "capture_video": capture_metadata["video_name"],
+                "feature": self.feature,
+                "distance": result["distance"],
+                "normalized_distance": result["normalized_distance"],
+            },
+            "path": result["path"].tolist(),
+            "frames": [
+                {
+                    "frame_index": frame_idx,
+                    "timestamp": frame_idx / fps,
+                    "deviation": {
+                        name: None if np.isnan(value) else float(value)
+                        for name, value in zip(joint_names, deviation)
+                    },
+                }
+                for frame_idx, deviation in enumerate(result["frame_deviation"])
+            ],
+        }
+
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(output_data, f, indent=2, ensure_ascii=False)
+
+
+def _naive_dtw(reference: np.ndarray, capture: np.ndarray) -> float:
+    """ベンチマーク用の素朴なDTW（全セルをPythonのループで計算）"""
+    n, m = len(reference), len(capture)
+    cost = np.full((n + 1, m + 1), np.inf)
+    cost[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            local = np.linalg.norm(reference[i - 1] - capture[j - 1])
+            cost[i, j] = local + min(cost[i - 1, j - 1], cost[i - 1, j], cost[i, j - 1])
+
+    return float(cost[n, m])
+
+
+def _synthetic_angles(num_frames: int, tempo: float, seed: int) -> np.ndarray:
+    """ベンチマーク用のスクワット風関節角度系列を生成"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_frames) / 30.0
+    # テンポを揺らした周期運動（膝・股関節は90〜170度）
+    phase = 2 * np.pi * tempo * t / 3.0 + 0.3 * np.sin(0.2 * t)
+    knee = 130 + 40 * np.cos(phase)
+    angles = np.stack([knee + 5 * k for k in range(6)], axis=1)
+
+    return angles + rng.normal(0, 1.0, angles.shape)
+
+
+def benchmark(sizes=(1000, 5000, 20000, 50000), radius: int = None) -> None:
+    """
+    DTWの処理時間とメモリ使用量を計測して表示
+
+    Args:
+        sizes: 計測するリファレンス系列のフレーム数
+        radius: DTWのバンド半径（Noneで自動）
+    """
+    # 小さな系列で素朴な実装と結果が一致することを確認
+    reference = _synthetic_angles(300, 1.0, seed=0)
+    capture = _synthetic_angles(360, 0.85, seed=1)
+    start = time.perf_counter()
+    expected = _naive_dtw(reference, capture)
+    naive_time = time.perf_counter() - start
+    start = time.perf_counter()
+    _, actual = dtw_align(reference, capture, radius=max(len(reference), len(capture)))
+    fast_time = time.perf_counter() - start
+    print("DTWベンチマーク")
+    print(f"  - 素朴な実装 (300x360): {naive_time:.2f}秒")
+    print(f"  - ベクトル化 (300x360, バンドなし): {fast_time:.3f}秒 "
+          f"(差: {abs(expected - actual):.2e})")
+
+    for size in sizes:
+        reference = _synthetic_angles(size, 1.0, seed=0)
+        capture = _synthetic_angles(int(size * 1.2), 0.85, seed=1)
+        start = time.perf_counter()
+        path, _ = dtw_align(reference, capture, radius=radius)
+        elapsed = time.perf_counter() - start
+
+        band_radius = radius if radius is not None else \
+            min(int(0.1 * len(capture)), MAX_BAND_RADIUS)
+        direction_mb = size * (2 * band_radius + 1) / 1024 ** 2
+        print(f"  - {size}x{len(capture)}フレーム: {elapsed:.2f}秒, "
+              f"経路長 {len(path)}, 方向配列 {direction_mb:.1f}MB")
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="リファレンス動作と撮影動作をDTWで比較"
+    )
+    parser.add_argument(
+        "-r",
+        "--reference",
+        help="リファレンス（お手本）のJSONファイルのパス",
+    )
+    parser.add_argument(
+        "-c",
+        "--capture",
+        help="比較する動作のJSONファイルのパス",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="出力JSONファイルのパス（デフォルト: output/<動画名>_comparison.json）",
+    )
+    parser.add_argument(
+        "--feature",
+        choices=MotionComparator.FEATURES,
+        default="angles",
+        help="位置合わせに使う特徴量（angles: 関節角度、pose: 正規化座標、デフォルト: angles）",
+    )
+    parser.add_argument(
+        "--radius",
+        type=int,
+        default=None,
+        help=f"DTWのバンド半径（フレーム数、デフォルト: 長い方の10%%、上限{MAX_BAND_RADIUS}）",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="合成データでDTWの処理時間を計測する",
+    )
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(radius=args.radius)
+        return
+
+    if not args.reference or not args.capture:
+        parser.error("--reference と --capture を指定してください")
+
+    comparator = MotionComparator(feature=args.feature, radius=args.radius)
+    reference, reference_metadata = comparator.load_sequence(args.reference)
+    capture, capture_metadata = comparator.load_sequence(args.capture)
+
+    result = comparator.compare(reference, capture)
+
+    if args.output is None:
+        output_path = (
+            Path("output")
+            / f"{Path(capture_metadata['video_name']).stem}_comparison.json"
+        )
+    else:
+        output_path = Path(args.output)
+
+    comparator.save_result(result, output_path, reference_metadata, capture_metadata)
+
+    print(f"\n動作比較完了!")
+    print(f"  - 平均コスト: {result['normalized_distance']:.3f}")
+    print(f"  - 出力ファイル: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
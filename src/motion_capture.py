@@ -10,30 +10,254 @@ import cv2
 import json
 import mediapipe as mp
 import numpy as np
+import shutil
+import tempfile
+import time
 from pathlib import Path
 from tqdm import tqdm
 
+from chunked_processing import LandmarkArrayWriter
+from repetition import RepetitionAnalyzer
+from utils import landmarks_to_array
+
+
+# 適応モードで精度の低いフレームに使う重いモデル
+HEAVY_MODEL_COMPLEXITY = 2
+
+
+class CaptureJsonWriter:
+    """
+    フレームデータを1フレームずつJSONファイルに書き出すクラス
+
+    フレームはいったん一時ファイル（<path>.part）に追記し、close() で
+    メタデータと合わせて json.dump(indent=2) と同じ形式のJSONとして保存します。
+    長時間の記録でも、全フレームをメモリに持たずに済みます。
+    """
+
+    def __init__(self, path: str):
+        """
+        初期化
+
+        Args:
+            path: 出力JSONファイルのパス
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.frame_count = 0
+
+        self._part_path = self.path.with_name(self.path.name + '.part')
+        self._part_file = open(self._part_path, 'w', encoding='utf-8')
+
+    def write(self, frame_data: dict) -> None:
+        """
+        1フレーム分のデータを追記
+
+        Args:
+            frame_data: create_frame_data で作成した辞書
+        """
+        if self.frame_count:
+            self._part_file.write(',\n')
+        self._part_file.write('    ' + self._dumps(frame_data, '    '))
+        self.frame_count += 1
+
+    def close(self, results_data: dict) -> Path:
+        """
+        JSONファイルとして保存し、一時ファイルを削除
+
+        Args:
+            results_data: 保存する辞書（"frames" の値は書き出したフレームで置き換える）
+
+        Returns:
+            出力JSONファイルのパス
+        """
+        self._part_file.close()
+
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{')
+            for key_idx, (key, value) in enumerate(results_data.items()):
+                f.write(',\n  ' if key_idx else '\n  ')
+                f.write(f'{json.dumps(key, ensure_ascii=False)}: ')
+                if key != "frames":
+                    f.write(self._dumps(value, '  '))
+                elif self.frame_count == 0:
+                    f.write('[]')
+                else:
+                    f.write('[\n')
+                    with open(self._part_path, 'r', encoding='utf-8') as part:
+                        shutil.copyfileobj(part, f, 16 * 1024 * 1024)
+                    f.write('\n  ]')
+            f.write('\n}' if results_data else '}')
+        self._part_path.unlink()
+
+        return self.path
+
+    @staticmethod
+    def _dumps(value, indent: str) -> str:
+        """indent の深さに埋め込む値をJSON文字列に変換"""
+        return json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n' + indent)
+
 
 class MotionCapture:
     """MediaPipeを使った3Dモーションキャプチャクラス"""
 
-    def __init__(self):
-        """初期化"""
+    def __init__(self, adaptive: bool = False, light_complexity: int = 1,
+                 visibility_threshold: float = 0.5, recovery_frames: int = 5):
+        """
+        初期化
+
+        Args:
+            adaptive: 適応モードを使うか。通常は軽いモデルで推定し、
+                      信頼度が低いフレームだけ重いモデル（complexity 2）を使う
+            light_complexity: 適応モードで通常使うモデル（0 または 1）
+            visibility_threshold: 平均visibilityがこの値未満なら重いモデルに切り替える
+            recovery_frames: 重いモデルで連続してこのフレーム数だけ信頼度が
+                             回復したら軽いモデルに戻す
+        """
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_drawing_styles = mp.solutions.drawing_styles
 
+        self.adaptive = adaptive
+        self.light_complexity = light_complexity
+        self.visibility_threshold = visibility_threshold
+        self.recovery_frames = recovery_frames
+
         # Poseモデルの設定
-        self.pose = self.mp_pose.Pose(
+        self.pose = self._create_pose(HEAVY_MODEL_COMPLEXITY)  # 0, 1, 2 (2が最も精度高い)
+
+        # 適応モード用の軽いモデル
+        self.light_pose = None
+        if adaptive:
+            if light_complexity not in (0, 1):
+                raise ValueError(f"軽いモデルのcomplexityは0か1です: {light_complexity}")
+            self.light_pose = self._create_pose(light_complexity)
+
+        self._use_heavy = False
+        self._recovered_frames = 0
+
+    def _create_pose(self, model_complexity: int):
+        """
+        Poseモデルを作成
+
+        Args:
+            model_complexity: モデルの複雑さ（0, 1, 2）
+
+        Returns:
+            MediaPipeのPoseモデル
+        """
+        return self.mp_pose.Pose(
             static_image_mode=False,
-            model_complexity=2,  # 0, 1, 2 (2が最も精度高い)
+            model_complexity=model_complexity,
             enable_segmentation=False,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
 
+    def _is_confident(self, results) -> bool:
+        """
+        推定結果の信頼度が十分か判定
+
+        Args:
+            results: MediaPipeの推定結果
+
+        Returns:
+            ランドマークが検出され、平均visibilityが閾値以上ならTrue
+        """
+        if not results.pose_landmarks:
+            return False
+
+        visibility = np.mean(
+            [landmark.visibility for landmark in results.pose_landmarks.landmark]
+        )
+        return visibility >= self.visibility_threshold
+
+    def estimate_pose(self, frame_rgb: np.ndarray):
+        """
+        1フレームの姿勢推定（適応モードではモデルを切り替える）
+
+        Args:
+            frame_rgb: RGB画像
+
+        Returns:
+            MediaPipeの推定結果と、推定に使ったモデルのcomplexity
+        """
+        if not self.adaptive:
+            return self.pose.process(frame_rgb), HEAVY_MODEL_COMPLEXITY
+
+        if not self._use_heavy:
+            results = self.light_pose.process(frame_rgb)
+            if self._is_confident(results):
+                return results, self.light_complexity
+
+            # 信頼度が低い・見失ったフレームは重いモデルでやり直す
+            # （重いモデルは前回使った時点の追跡領域・スムージングの状態を
+            #   持っているので、リセットしてから使う）
+            self._use_heavy = True
+            self._recovered_frames = 0
+            self.pose.reset()
+
+        results = self.pose.process(frame_rgb)
+
+        # 信頼度が一定フレーム続けて回復したら軽いモデルに戻す
+        if self._is_confident(results):
+            self._recovered_frames += 1
+            if self._recovered_frames >= self.recovery_frames:
+                self._use_heavy = False
+                # 軽いモデルも重いモデルを使っている間は止まっていたのでリセット
+                self.light_pose.reset()
+        else:
+            self._recovered_frames = 0
+
+        return results, HEAVY_MODEL_COMPLEXITY
+
+    def create_frame_data(self, frame_idx: int, fps: float, results,
+                          model_complexity: int) -> dict:
+        """
+        推定結果から1フレーム分の出力データを作成
+
+        Args:
+            frame_idx: フレーム番号
+            fps: 動画のフレームレート
+            results: MediaPipeの推定結果
+            model_complexity: 推定に使ったモデルのcomplexity
+
+        Returns:
+            フレーム番号・タイムスタンプ・2D/3D座標を含む辞書
+        """
+        frame_data = {
+            "frame_index": frame_idx,
+            "timestamp": frame_idx / fps,
+            "model_complexity": model_complexity,
+            "landmarks_2d": [],
+            "landmarks_3d": []
+        }
+
+        # ランドマークが検出された場合
+        if results.pose_landmarks:
+            # 2D座標（画像上の座標）
+            for landmark in results.pose_landmarks.landmark:
+                frame_data["landmarks_2d"].append({
+                    "x": landmark.x,
+                    "y": landmark.y,
+                    "z": landmark.z,  # 深度情報
+                    "visibility": landmark.visibility
+                })
+
+            # 3D座標（ワールド座標系）
+            if results.pose_world_landmarks:
+                for landmark in results.pose_world_landmarks.landmark:
+                    frame_data["landmarks_3d"].append({
+                        "x": landmark.x,
+                        "y": landmark.y,
+                        "z": landmark.z,
+                        "visibility": landmark.visibility
+                    })
+
+        return frame_data
+
     def process_video(self, video_path: str, output_path: str = None,
-                     visualize: bool = True) -> dict:
+                     visualize: bool = True, count_reps: bool = False,
+                     landmarks_path: str = None, keep_frames: bool = True) -> dict:
         """
         動画を処理して3D座標を抽出
 
@@ -41,6 +265,12 @@ class MotionCapture:
             video_path: 入力動画のパス
             output_path: 出力JSONファイルのパス（Noneの場合は自動生成）
             visualize: 可視化結果の動画を保存するか
+            count_reps: 処理しながらレップ数と各フェーズを解析するか
+                        （結果は "repetitions" に保存）
+            landmarks_path: 3D座標を (frames, 33, 3) の .npy としても保存するパス
+                            （Noneの場合は保存しない。chunked_processing.py の入力）
+            keep_frames: フレームデータをメモリにも保持して返すか。Falseの場合は
+                         JSONへ1フレームずつ書き出すだけで、返り値の "frames" は空
 
         Returns:
             抽出した座標データを含む辞書
@@ -89,8 +319,27 @@ class MotionCapture:
             "frames": []
         }
 
+        # 推定に使ったモデルごとのフレーム数
+        complexity_counts = {}
+        self._use_heavy = False
+        self._recovered_frames = 0
+        # 前の動画の追跡状態を引き継がない
+        self.pose.reset()
+        if self.light_pose:
+            self.light_pose.reset()
+
+        # レップの解析
+        analyzer = RepetitionAnalyzer(fps=fps) if count_reps else None
+
+        # 長時間記録の後処理用に、3D座標を .npy に書き出す
+        landmarks_writer = LandmarkArrayWriter(landmarks_path) if landmarks_path else None
+
+        # JSONは1フレームずつ書き出す（keep_frames=False なら全フレームをメモリに持たない）
+        json_writer = CaptureJsonWriter(output_path)
+
         # フレームごとに処理
         frame_idx = 0
+        start_time = time.perf_counter()
         with tqdm(total=frame_count, desc="解析中") as pbar:
             while cap.isOpened():
                 success, frame = cap.read()
@@ -101,36 +350,16 @@ class MotionCapture:
                 frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
                 # 姿勢推定
-                results = self.pose.process(frame_rgb)
+                results, model_complexity = self.estimate_pose(frame_rgb)
+                complexity_counts[model_complexity] = \
+                    complexity_counts.get(model_complexity, 0) + 1
 
-                frame_data = {
-                    "frame_index": frame_idx,
-                    "timestamp": frame_idx / fps,
-                    "landmarks_2d": [],
-                    "landmarks_3d": []
-                }
+                frame_data = self.create_frame_data(
+                    frame_idx, fps, results, model_complexity
+                )
 
                 # ランドマークが検出された場合
                 if results.pose_landmarks:
-                    # 2D座標（画像上の座標）
-                    for landmark in results.pose_landmarks.landmark:
-                        frame_data["landmarks_2d"].append({
-                            "x": landmark.x,
-                            "y": landmark.y,
-                            "z": landmark.z,  # 深度情報
-                            "visibility": landmark.visibility
-                        })
-
-                    # 3D座標（ワールド座標系）
-                    if results.pose_world_landmarks:
-                        for landmark in results.pose_world_landmarks.landmark:
-                            frame_data["landmarks_3d"].append({
-                                "x": landmark.x,
-                                "y": landmark.y,
-                                "z": landmark.z,
-                                "visibility": landmark.visibility
-                            })
-
                     # 可視化
                     if visualize and video_writer:
                         # スケルトンを描画
@@ -142,23 +371,62 @@ class MotionCapture:
                         )
                         video_writer.write(frame)
 
-                results_data["frames"].append(frame_data)
+                json_writer.write(frame_data)
+                if keep_frames:
+                    results_data["frames"].append(frame_data)
+
+                if landmarks_writer:
+                    landmarks_writer.write(
+                        np.array([[lm["x"], lm["y"], lm["z"]]
+                                  for lm in frame_data["landmarks_3d"]])
+                        if frame_data["landmarks_3d"] else None
+                    )
+
+                # 確定したレップをその場で表示
+                if analyzer:
+                    for event in analyzer.update_frame(frame_data):
+                        if event["type"] == "rep":
+                            pbar.write(
+                                f"  {event['rep_index'] + 1}回目: "
+                                f"{event['duration']:.2f}秒"
+                            )
+
                 frame_idx += 1
                 pbar.update(1)
 
+        elapsed = time.perf_counter() - start_time
+
         # リソースの解放
         cap.release()
         if video_writer:
             video_writer.release()
+        if landmarks_writer:
+            landmarks_writer.close()
+
+        results_data["metadata"]["processing"] = {
+            "mode": "adaptive" if self.adaptive else "fixed",
+            "elapsed_seconds": elapsed,
+            "frames_per_second": frame_idx / elapsed if elapsed > 0 else 0.0,
+            "model_complexity_counts": {
+                str(complexity): count
+                for complexity, count in sorted(complexity_counts.items())
+            }
+        }
+
+        if analyzer:
+            results_data["repetitions"] = analyzer.summary()
 
         # JSONに保存
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(results_data, f, indent=2, ensure_ascii=False)
+        json_writer.close(results_data)
 
         print(f"\n解析完了!")
         print(f"  - 座標データ: {output_path}")
         if visualize:
             print(f"  - 可視化動画: {output_video_path}")
+        if landmarks_writer:
+            print(f"  - 3D座標配列: {landmarks_writer.path}")
+        if analyzer:
+            print(f"  - レップ数: {results_data['repetitions']['rep_count']}")
 
         return results_data
 
@@ -166,6 +434,74 @@ class MotionCapture:
         """デストラクタ"""
         if hasattr(self, 'pose'):
             self.pose.close()
+        if getattr(self, 'light_pose', None):
+            self.light_pose.close()
+
+
+def compare_with_heavy(video_path: str, light_complexity: int = 1,
+                       visibility_threshold: float = 0.5,
+                       recovery_frames: int = 5) -> dict:
+    """
+    適応モードと常に重いモデルを使う場合の処理速度と精度を比較
+
+    重いモデルの結果を基準として、適応モードの3D座標との差を計算します。
+
+    Args:
+        video_path: 入力動画のパス
+        light_complexity: 適応モードで通常使うモデル（0 または 1）
+        visibility_threshold: 重いモデルに切り替える平均visibilityの閾値
+        recovery_frames: 軽いモデルに戻すまでに必要な連続フレーム数
+
+    Returns:
+        処理速度、モデルごとのフレーム数、重いモデルとの座標差を含む辞書
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        heavy = MotionCapture().process_video(
+            video_path, Path(tmp_dir) / "heavy.json", visualize=False
+        )
+        adaptive = MotionCapture(
+            adaptive=True,
+            light_complexity=light_complexity,
+            visibility_threshold=visibility_threshold,
+            recovery_frames=recovery_frames
+        ).process_video(
+            video_path, Path(tmp_dir) / "adaptive.json", visualize=False
+        )
+
+    heavy_landmarks, heavy_valid = landmarks_to_array(heavy["frames"])
+    adaptive_landmarks, adaptive_valid = landmarks_to_array(adaptive["frames"])
+    common = sorted(set(heavy_valid) & set(adaptive_valid))
+
+    # 両方で検出できたフレームでの関節点ごとの距離（ワールド座標、メートル）
+    errors = np.linalg.norm(
+        heavy_landmarks[common] - adaptive_landmarks[common], axis=2
+    )
+
+    heavy_fps = heavy["metadata"]["processing"]["frames_per_second"]
+    adaptive_fps = adaptive["metadata"]["processing"]["frames_per_second"]
+    comparison = {
+        "heavy_fps": heavy_fps,
+        "adaptive_fps": adaptive_fps,
+        "speedup": adaptive_fps / heavy_fps if heavy_fps > 0 else 0.0,
+        "model_complexity_counts":
+            adaptive["metadata"]["processing"]["model_complexity_counts"],
+        "heavy_detected_frames": len(heavy_valid),
+        "adaptive_detected_frames": len(adaptive_valid),
+        "mean_error": float(errors.mean()) if len(common) else None,
+        "p95_error": float(np.percentile(errors.mean(axis=1), 95)) if len(common) else None,
+    }
+
+    print(f"\n適応モードの比較結果:")
+    print(f"  - 常に重いモデル: {heavy_fps:.1f} fps")
+    print(f"  - 適応モード: {adaptive_fps:.1f} fps ({comparison['speedup']:.2f}倍)")
+    print(f"  - モデルごとのフレーム数: {comparison['model_complexity_counts']}")
+    print(f"  - 検出フレーム数: 重いモデル {len(heavy_valid)}, "
+          f"適応モード {len(adaptive_valid)}")
+    if len(common):
+        print(f"  - 重いモデルとの平均誤差: {comparison['mean_error'] * 100:.2f} cm "
+              f"(95パーセンタイル: {comparison['p95_error'] * 100:.2f} cm)")
+
+    return comparison
 
 
 def main():
@@ -188,15 +524,79 @@ def main():
         action='store_true',
         help='可視化動画を生成しない'
     )
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='軽いモデルで推定し、信頼度が低いフレームだけ重いモデルを使う'
+    )
+    parser.add_argument(
+        '--light-complexity',
+        type=int,
+        choices=[0, 1],
+        default=1,
+        help='適応モードで通常使うモデル（デフォルト: 1）'
+    )
+    parser.add_argument(
+        '--visibility-threshold',
+        type=float,
+        default=0.5,
+        help='重いモデルに切り替える平均visibilityの閾値（デフォルト: 0.5）'
+    )
+    parser.add_argument(
+        '--recovery-frames',
+        type=int,
+        default=5,
+        help='重いモデルで連続してこのフレーム数だけ信頼度が回復したら'
+             '軽いモデルに戻す（デフォルト: 5）'
+    )
+    parser.add_argument(
+        '--compare-heavy',
+        action='store_true',
+        help='適応モードと常に重いモデルを使う場合の速度・精度を比較する'
+    )
+    parser.add_argument(
+        '--count-reps',
+        action='store_true',
+        help='処理しながらスクワットなどのレップ数を数える'
+    )
+    parser.add_argument(
+        '--save-npy',
+        action='store_true',
+        help='3D座標を (フレーム数, 33, 3) の .npy としても保存する'
+             '（出力: <出力JSONと同じフォルダ>/<動画名>_landmarks.npy）'
+    )
 
     args = parser.parse_args()
 
+    if args.compare_heavy:
+        compare_with_heavy(
+            video_path=args.input,
+            light_complexity=args.light_complexity,
+            visibility_threshold=args.visibility_threshold,
+            recovery_frames=args.recovery_frames
+        )
+        return
+
     # モーションキャプチャ実行
-    mc = MotionCapture()
+    mc = MotionCapture(
+        adaptive=args.adaptive,
+        light_complexity=args.light_complexity,
+        visibility_threshold=args.visibility_threshold,
+        recovery_frames=args.recovery_frames
+    )
+    landmarks_path = None
+    if args.save_npy:
+        output_dir = Path(args.output).parent if args.output else Path("output")
+        landmarks_path = output_dir / f"{Path(args.input).stem}_landmarks.npy"
+
+    # 結果はファイルに書き出すだけなので、フレームデータはメモリに保持しない
     mc.process_video(
         video_path=args.input,
         output_path=args.output,
-        visualize=not args.no_visualize
+        visualize=not args.no_visualize,
+        count_reps=args.count_reps,
+        landmarks_path=landmarks_path,
+        keep_frames=False
     )
 
 
@@ -0,0 +1,1057 @@
+"""
+並列モーションキャプチャスクリプト
+
+動画をフレーム番号の連続した区間に分け、区間ごとに
+デコードプロセスと推定プロセスの組（パイプライン）を並列に実行します。
+デコードしたフレームは共有メモリ上のリングバッファ（あらかじめ確保したフレームスロット）
+に直接書き込み、推定プロセスはそのスロットをコピーせずに読み込みます。
+プロセス間で受け渡すのはフレーム番号とスロット番号だけなので、
+4K動画でもフレームをpickleするコストがかかりません。
+
+MediaPipe の Pose は前のフレームの追跡結果とスムージングの状態を使うため、
+各推定プロセスは区間の少し手前（ウォームアップ）から推定を始め、
+ウォームアップ分の結果は捨てます。
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+import traceback
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import List, Optional, Tuple
+from tqdm import tqdm
+
+
+# パイプラインごとのリングバッファのスロット数のデフォルト（4Kで1スロット約24MB）
+DEFAULT_NUM_SLOTS = 4
+
+# 区間の手前から推定を始めて結果を捨てるフレーム数のデフォルト
+# （追跡領域とスムージングの状態を1プロセスで処理した場合に近づける）
+DEFAULT_WARMUP_FRAMES = 30
+
+# キューを待つ間隔（秒）。この間隔で停止要求とプロセスの異常終了を確認する
+POLL_INTERVAL = 0.5
+
+# 子プロセスは spawn で起動する（MediaPipe のグラフがスレッドを持った状態で
+# fork すると、子プロセスで Pose を作成したときに異常終了するため）
+_mp_context = multiprocessing.get_context("spawn")
+
+
+class FrameRingBuffer:
+    """共有メモリ上のフレームスロットのリングバッファ"""
+
+    def __init__(self, num_slots: int, frame_shape: Tuple[int, int, int]):
+        """
+        初期化（共有メモリを確保し、全スロットを空きにする）
+
+        Args:
+            num_slots: スロット数
+            frame_shape: 1フレームの形状 (height, width, 3)
+        """
+        self.num_slots = num_slots
+        self.frame_shape = tuple(frame_shape)
+
+        size = num_slots * int(np.prod(self.frame_shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.frames = self._map_frames()
+
+        # 空きスロットと、書き込み済みスロット（フレーム番号, スロット番号）のキュー
+        self.free_slots = _mp_context.Queue()
+        self.filled_slots = _mp_context.Queue()
+        for slot in range(num_slots):
+            self.free_slots.put(slot)
+
+    def _map_frames(self) -> np.ndarray:
+        """共有メモリを (slots, height, width, 3) の配列として参照"""
+        return np.ndarray(
+            (self.num_slots,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf
+        )
+
+    def __getstate__(self):
+        """子プロセスには共有メモリの名前だけを渡す"""
+        state = self.__dict__.copy()
+        state["shm"] = self.shm.name
+        del state["frames"]
+        return state
+
+    def __setstate__(self, state):
+        """子プロセス側で共有メモリに接続し直す"""
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=state["shm"])
+        self.frames = self._map_frames()
+
+    def acquire(self, stop_event) -> Optional[int]:
+        """
+        空きスロットを取得（空きがなければ推定プロセスが返すまで待つ）
+
+        Args:
+            stop_event: 停止要求のイベント
+
+        Returns:
+            スロット番号（停止要求があった場合はNone）
+        """
+        while not stop_event.is_set():
+            try:
+                return self.free_slots.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+        return None
+
+    def publish(self, frame_idx: int, slot: int) -> None:
+        """
+        書き込み済みのスロットを推定プロセスに渡す
+
+        Args:
+            frame_idx: フレーム番号
+            slot: スロット番号
+        """
+        self.filled_slots.put((frame_idx, slot))
+
+    def next_filled(self, stop_event) -> Optional[Tuple[int, int]]:
+        """
+        書き込み済みのスロットを取得
+
+        Args:
+            stop_event: 停止要求のイベント
+
+        Returns:
+            (フレーム番号, スロット番号)（終了または停止要求の場合はNone）
+        """
+        while not stop_event.is_set():
+            try:
+                return self.filled_slots.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+        return None
+
+    def release(self, slot: int) -> None:
+        """
+        読み終わったスロットを空きに戻す
+
+        Args:
+            slot: スロット番号
+        """
+        self.free_slots.put(slot)
+
+    def finish(self, num_consumers: int) -> None:
+        """
+        すべてのフレームを渡し終えたことを推定プロセスに通知
+
+        Args:
+            num_consumers: 推定プロセスの数
+        """
+        for _ in range(num_consumers):
+            self.filled_slots.put(None)
+
+    def close(self) -> None:
+        """このプロセスから共有メモリへの接続を閉じる"""
+        del self.frames
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """共有メモリを解放（作成したプロセスで1回だけ呼ぶ）"""
+        self.shm.unlink()
+
+
+class _PickleFrameQueue:
+    """
+    ベンチマーク用: FrameRingBuffer と同じ使い方で、フレームをpickleして渡すキュー
+
+    デコードプロセスは自分のメモリ上のバッファに書き込み、publish でフレームごと
+    pickleしてキューに送ります。キューの長さを num_slots に制限しているので、
+    num_slots + 1 個のバッファを順に使えば送信待ちのフレームを上書きしません。
+    """
+
+    def __init__(self, num_slots: int, frame_shape: Tuple[int, int, int]):
+        """
+        初期化
+
+        Args:
+            num_slots: キューに入れておけるフレーム数
+            frame_shape: 1フレームの形状 (height, width, 3)
+        """
+        self.num_slots = num_slots
+        self.frame_shape = tuple(frame_shape)
+        self.filled_slots = _mp_context.Queue(maxsize=num_slots)
+        self.frames = None
+        self._next_slot = 0
+
+    def acquire(self, stop_event) -> Optional[int]:
+        """次に書き込むバッファの番号を取得（停止要求があった場合はNone）"""
+        if stop_event.is_set():
+            return None
+        if self.frames is None:
+            self.frames = np.empty(
+                (self.num_slots + 1,) + self.frame_shape, dtype=np.uint8
+            )
+
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % (self.num_slots + 1)
+        return slot
+
+    def publish(self, frame_idx: int, slot: int) -> None:
+        """バッファのフレームをpickleして推定プロセスに送る"""
+        self.filled_slots.put((frame_idx, self.frames[slot]))
+
+    def next_filled(self, stop_event) -> Optional[Tuple[int, int]]:
+        """受け取ったフレームを frames[0] として参照できるようにする"""
+        while not stop_event.is_set():
+            try:
+                item = self.filled_slots.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is None:
+                return None
+            frame_idx, frame = item
+            self.frames = frame[None]
+            return frame_idx, 0
+
+        return None
+
+    def release(self, slot: int) -> None:
+        """受け取ったフレームは推定プロセスのものなので何もしない"""
+
+    def finish(self, num_consumers: int) -> None:
+        """すべてのフレームを渡し終えたことを推定プロセスに通知"""
+        for _ in range(num_consumers):
+            self.filled_slots.put(None)
+
+    def close(self) -> None:
+        """バッファを解放"""
+        self.frames = None
+
+    def unlink(self) -> None:
+        """共有メモリを使わないので何もしない"""
+
+
+def split_frame_ranges(frame_count: int, num_workers: int,
+                       warmup_frames: int) -> List[Tuple[int, int, Optional[int]]]:
+    """
+    動画をパイプラインごとの連続した区間に分ける
+
+    Args:
+        frame_count: 動画のフレーム数（コンテナの値なので多少ずれてもよい）
+        num_workers: パイプラインの数
+        warmup_frames: 区間の手前から推定を始めるフレーム数
+
+    Returns:
+        (デコード開始フレーム, 出力開始フレーム, 終了フレーム) のリスト。
+        最後の区間の終了フレームは None（動画の最後まで読む）
+    """
+    num_ranges = max(1, min(num_workers, frame_count))
+    bounds = [frame_count * i // num_ranges for i in range(num_ranges + 1)]
+
+    return [
+        (max(bounds[i] - warmup_frames, 0), bounds[i],
+         bounds[i + 1] if i + 1 < num_ranges else None)
+        for i in range(num_ranges)
+    ]
+
+
+def open_video_at(video_path: str, start_frame: int) -> cv2.VideoCapture:
+    """
+    動画を開いて指定したフレームから読めるようにする
+
+    Args:
+        video_path: 入力動画のパス
+        start_frame: 最初に読むフレーム番号
+
+    Returns:
+        start_frame の位置にある VideoCapture
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if start_frame == 0:
+        return cap
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == start_frame:
+        return cap
+
+    # シークできない形式では先頭から読み飛ばす
+    cap.release()
+    cap = cv2.VideoCapture(str(video_path))
+    for _ in range(start_frame):
+        if not cap.grab():
+            break
+
+    return cap
+
+
+def _decode_frames(video_path: str, ring: FrameRingBuffer,
+                   frame_range: Tuple[int, int, Optional[int]],
+                   result_queue, stop_event) -> None:
+    """
+    デコードプロセス: 区間のフレームを読み込み、空きスロットに直接書き込む
+
+    Args:
+        video_path: 入力動画のパス
+        ring: フレームのリングバッファ
+        frame_range: (デコード開始フレーム, 出力開始フレーム, 終了フレーム)
+        result_queue: 結果・エラーを親プロセスに送るキュー
+        stop_event: 停止要求のイベント
+    """
+    try:
+        decode_start, _, stop = frame_range
+        cap = open_video_at(video_path, decode_start)
+        frame_idx = decode_start
+
+        while not stop_event.is_set() and (stop is None or frame_idx < stop):
+            slot = ring.acquire(stop_event)
+            if slot is None:
+                break
+
+            # スロットを出力先に指定してデコード（サイズが違う場合だけコピー）
+            slot_view = ring.frames[slot]
+            success, frame = cap.read(slot_view)
+            if not success:
+                ring.release(slot)
+                break
+            if frame.ctypes.data != slot_view.ctypes.data:
+                np.copyto(slot_view, frame)
+
+            ring.publish(frame_idx, slot)
+            frame_idx += 1
+
+        cap.release()
+        ring.finish(1)
+        # 読み終えた位置（次のフレーム番号）を通知（1フレームも読めなかった場合は0）
+        result_queue.put(("decoded", frame_idx if frame_idx > decode_start else 0))
+    except Exception:
+        result_queue.put(("error", "decoder", traceback.format_exc()))
+    finally:
+        ring.close()
+
+
+def _infer_frames(ring: FrameRingBuffer, result_queue, stop_event, fps: float,
+                  capture_options: Optional[dict], output_start: int) -> None:
+    """
+    推定プロセス: スロットのフレームを読み込んで姿勢推定する
+
+    Args:
+        ring: フレームのリングバッファ
+        result_queue: 結果・エラーを親プロセスに送るキュー
+        stop_event: 停止要求のイベント
+        fps: 動画のフレームレート
+        capture_options: MotionCapture に渡す引数（Noneの場合は推定せず
+                         フレームの受け渡しだけを行う。ベンチマーク用）
+        output_start: このフレームより前はウォームアップとして結果を捨てる
+    """
+    try:
+        mc = None
+        if capture_options is not None:
+            from motion_capture import MotionCapture
+            mc = MotionCapture(**capture_options)
+
+        frame_rgb = np.empty(ring.frame_shape, dtype=np.uint8)
+
+        while True:
+            item = ring.next_filled(stop_event)
+            if item is None:
+                break
+            frame_idx, slot = item
+
+            # BGRからRGBに変換した時点でスロットは不要になるので、すぐに空きに戻す
+            cv2.cvtColor(ring.frames[slot], cv2.COLOR_BGR2RGB, dst=frame_rgb)
+            ring.release(slot)
+
+            frame_data = None
+            if mc is not None:
+                results, model_complexity = mc.estimate_pose(frame_rgb)
+                frame_data = mc.create_frame_data(
+                    frame_idx, fps, results, model_complexity
+                )
+
+            if frame_idx >= output_start:
+                result_queue.put(("frame", frame_idx, frame_data))
+
+        result_queue.put(("done", None))
+    except Exception:
+        result_queue.put(("error", "inference", traceback.format_exc()))
+    finally:
+        ring.close()
+
+
+def measure_timing(num_frames: int, start_time: float,
+                   first_frame_time: Optional[float],
+                   last_frame_time: Optional[float]) -> dict:
+    """
+    起動時間と定常状態の処理速度を計算
+
+    起動時間は開始から最初のフレームの処理が終わるまで（プロセス生成・モデルの
+    読み込みを含む）、定常状態の速度は最初と最後のフレームの処理が終わった時刻の
+    間に処理したフレーム数から求めます。時刻は time.perf_counter() の値で、
+    プロセスをまたいで比較できます。
+
+    Args:
+        num_frames: 処理したフレーム数
+        start_time: 開始時刻
+        first_frame_time: 最初のフレームの処理が終わった時刻
+        last_frame_time: 最後のフレームの処理が終わった時刻
+
+    Returns:
+        "frames", "startup_seconds", "steady_fps" を含む辞書
+    """
+    if first_frame_time is None:
+        return {"frames": num_frames, "startup_seconds": 0.0, "steady_fps": 0.0}
+
+    steady_seconds = last_frame_time - first_frame_time
+    return {
+        "frames": num_frames,
+        "startup_seconds": first_frame_time - start_time,
+        "steady_fps": (num_frames - 1) / steady_seconds if steady_seconds > 0 else 0.0,
+    }
+
+
+class ParallelMotionCapture:
+    """動画の区間ごとにデコードと姿勢推定を並列に行うモーションキャプチャクラス"""
+
+    def __init__(self, num_workers: int = 2, num_slots: int = DEFAULT_NUM_SLOTS,
+                 warmup_frames: int = DEFAULT_WARMUP_FRAMES,
+                 adaptive: bool = False, light_complexity: int = 1,
+                 visibility_threshold: float = 0.5, recovery_frames: int = 5):
+        """
+        初期化
+
+        動画を num_workers 個の連続した区間に分け、区間ごとにデコードプロセスと
+        推定プロセス（MotionCapture を1つ持つ）を起動します。
+        各推定プロセスは区間の warmup_frames フレーム手前から推定を始めるので、
+        区間の境目でも追跡・スムージング・適応モードの状態が引き継がれた状態に
+        近くなります（1プロセスで処理した結果とは完全には一致しません）。
+
+        Args:
+            num_workers: パイプライン（デコード + 推定プロセスの組）の数
+            num_slots: パイプラインごとのリングバッファのスロット数
+            warmup_frames: 区間の手前から推定を始めて結果を捨てるフレーム数
+            adaptive: MotionCapture の適応モードを使うか
+            light_complexity: 適応モードで通常使うモデル（0 または 1）
+            visibility_threshold: 重いモデルに切り替える平均visibilityの閾値
+            recovery_frames: 軽いモデルに戻すまでに必要な連続フレーム数
+        """
+        if num_workers < 1 or num_slots < 1:
+            raise ValueError("プロセス数とスロット数は1以上にしてください")
+
+        self.num_workers = num_workers
+        self.num_slots = num_slots
+        self.warmup_frames = warmup_frames
+        self.capture_options = {
+            "adaptive": adaptive,
+            "light_complexity": light_complexity,
+            "visibility_threshold": visibility_threshold,
+            "recovery_frames": recovery_frames,
+        }
+
+    def run(self, video_path: str, inference: bool = True,
+            pickle_frames: bool = False) -> dict:
+        """
+        区間ごとのパイプラインを起動して全フレームを処理
+
+        Args:
+            video_path: 入力動画のパス
+            inference: 姿勢推定を行うか（Falseの場合はフレームの受け渡しのみ）
+            pickle_frames: フレームを共有メモリではなくpickleで受け渡すか
+                           （ベンチマークで受け渡し方法だけを比較するため）
+
+        Returns:
+            メタデータとフレーム番号順に並んだフレームデータを含む辞書
+        """
+        video_path = Path(video_path)
+        if not video_path.exists():
+            raise FileNotFoundError(f"動画ファイルが見つかりません: {video_path}")
+
+        cap = cv2.VideoCapture(str(video_path))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        frame_ranges = split_frame_ranges(
+            frame_count, self.num_workers, self.warmup_frames
+        )
+        buffer_class = _PickleFrameQueue if pickle_frames else FrameRingBuffer
+        result_queue = _mp_context.Queue()
+        stop_event = _mp_context.Event()
+        capture_options = self.capture_options if inference else None
+
+        rings = []
+        processes = []
+        frames = []
+        pending = {}
+        finished_workers = 0
+        decoded_ends = []
+        # 起動（共有メモリの確保・プロセス生成・モデルの読み込み）と定常状態を分けて計測する
+        start_time = time.perf_counter()
+        first_frame_time = last_frame_time = None
+
+        try:
+            # 共有メモリは try の中で1つずつ確保し、途中で失敗しても
+            # 確保済みのものだけを finally で解放する
+            for worker_idx, frame_range in enumerate(frame_ranges):
+                ring = buffer_class(self.num_slots, (height, width, 3))
+                rings.append(ring)
+                processes.append(_mp_context.Process(
+                    target=_decode_frames,
+                    args=(video_path, ring, frame_range, result_queue, stop_event),
+                    name=f"decoder-{worker_idx}",
+                ))
+                processes.append(_mp_context.Process(
+                    target=_infer_frames,
+                    args=(ring, result_queue, stop_event, fps, capture_options,
+                          frame_range[1]),
+                    name=f"inference-{worker_idx}",
+                ))
+
+            for process in processes:
+                process.start()
+
+            with tqdm(total=frame_count, desc="解析中") as pbar:
+                while finished_workers < len(frame_ranges) or \
+                        len(decoded_ends) < len(frame_ranges):
+                    try:
+                        message = result_queue.get(timeout=POLL_INTERVAL)
+                    except queue.Empty:
+                        self._check_processes(processes)
+                        continue
+
+                    kind = message[0]
+                    if kind == "frame":
+                        # 区間ごとに並列に終わるので、フレーム番号順に並べ直す
+                        _, frame_idx, frame_data = message
+                        pending[frame_idx] = frame_data
+                        last_frame_time = time.perf_counter()
+                        if first_frame_time is None:
+                            first_frame_time = last_frame_time
+                        while len(frames) in pending:
+                            frames.append(pending.pop(len(frames)))
+                            pbar.update(1)
+                    elif kind == "decoded":
+                        decoded_ends.append(message[1])
+                    elif kind == "done":
+                        finished_workers += 1
+                    elif kind == "error":
+                        raise RuntimeError(
+                            f"{message[1]}プロセスでエラーが発生しました:\n{message[2]}"
+                        )
+
+            # 区間の間に抜けたフレームがあると pending に残る
+            if pending or max(decoded_ends) != len(frames):
+                raise RuntimeError("処理されなかったフレームがあります")
+
+            for process in processes:
+                process.join()
+        finally:
+            stop_event.set()
+            for process in processes:
+                if process.is_alive():
+                    process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            for ring in rings:
+                ring.close()
+                ring.unlink()
+
+        elapsed = time.perf_counter() - start_time
+        timing = measure_timing(len(frames), start_time, first_frame_time, last_frame_time)
+
+        return {
+            "metadata": {
+                "video_name": video_path.name,
+                "fps": fps,
+                "frame_count": frame_count,
+                "resolution": {"width": width, "height": height},
+                "processing": {
+                    "mode": "parallel",
+                    "num_workers": len(frame_ranges),
+                    "num_slots": self.num_slots,
+                    "warmup_frames": self.warmup_frames,
+                    "elapsed_seconds": elapsed,
+                    "frames_per_second": len(frames) / elapsed if elapsed > 0 else 0.0,
+                    "startup_seconds": timing["startup_seconds"],
+                    "steady_frames_per_second": timing["steady_fps"],
+                },
+            },
+            "frames": frames,
+        }
+
+    @staticmethod
+    def _check_processes(processes) -> None:
+        """
+        異常終了した子プロセスがないか確認
+
+        Args:
+            processes: 子プロセスのリスト
+        """
+        for process in processes:
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(
+                    f"{process.name}プロセスが異常終了しました (exitcode={process.exitcode})"
+                )
+
+    def process_video(self, video_path: str, output_path: str = None) -> dict:
+        """
+        動画を処理して3D座標を抽出（MotionCapture.process_video と同じ構造のJSONで保存）
+
+        Args:
+            video_path: 入力動画のパス
+            output_path: 出力JSONファイルのパス（Noneの場合は自動生成）
+
+        Returns:
+            抽出した座標データを含む辞書
+        """
+        video_path = Path(video_path)
+        if output_path is None:
+            output_path = Path("output") / f"{video_path.stem}_3d_coords.json"
+        else:
+            output_path = Path(output_path)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        results_data = self.run(video_path)
+
+        complexity_counts = {}
+        for frame_data in results_data["frames"]:
+            complexity = str(frame_data["model_complexity"])
+            complexity_counts[complexity] = complexity_counts.get(complexity, 0) + 1
+        results_data["metadata"]["processing"]["model_complexity_counts"] = \
+            dict(sorted(complexity_counts.items()))
+
+        # JSONに保存
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results_data, f, indent=2, ensure_ascii=False)
+
+        print(f"\n解析完了!")
+        print(f"  - 座標データ: {output_path}")
+
+        return results_data
+
+
+def verify(video_path: str, num_workers: int = 2,
+           num_slots: int = DEFAULT_NUM_SLOTS,
+           warmup_frames: int = DEFAULT_WARMUP_FRAMES,
+           adaptive: bool = False, light_complexity: int = 1,
+           visibility_threshold: float = 0.5, recovery_frames: int = 5) -> dict:
+    """
+    並列モードの出力が1プロセスの MotionCapture.process_video と一致するか確認
+
+    1. 各区間の先頭へのシークで、先頭から順に読んだ場合と同じフレームが得られるか
+    2. 両方の3D座標（ワールド座標）の差。区間の境目の直後とそれ以外に分けて集計
+
+    Args:
+        video_path: 入力動画のパス
+        num_workers: パイプラインの数
+        num_slots: パイプラインごとのスロット数
+        warmup_frames: ウォームアップのフレーム数
+        adaptive: 適応モードで比較するか
+        light_complexity: 適応モードで通常使うモデル（0 または 1）
+        visibility_threshold: 重いモデルに切り替える平均visibilityの閾値
+        recovery_frames: 軽いモデルに戻すまでに必要な連続フレーム数
+
+    Returns:
+        シークの確認結果と座標差を含む辞書
+    """
+    from motion_capture import MotionCapture
+    from utils import landmarks_to_array
+
+    parallel = ParallelMotionCapture(
+        num_workers=num_workers, num_slots=num_slots,
+        warmup_frames=warmup_frames, adaptive=adaptive,
+        light_complexity=light_complexity,
+        visibility_threshold=visibility_threshold,
+        recovery_frames=recovery_frames
+    )
+
+    # 1. シークの確認（先頭から順に読んだフレームと比較）
+    cap = cv2.VideoCapture(str(video_path))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_ranges = split_frame_ranges(frame_count, num_workers, warmup_frames)
+    seek_starts = sorted({decode_start for decode_start, _, _ in frame_ranges} - {0})
+    sequential = {}
+    frame_idx = 0
+    while seek_starts and frame_idx <= seek_starts[-1]:
+        success, frame = cap.read()
+        if not success:
+            break
+        if frame_idx in seek_starts:
+            sequential[frame_idx] = frame
+        frame_idx += 1
+    cap.release()
+
+    seek_mismatches = []
+    for start in seek_starts:
+        cap = open_video_at(video_path, start)
+        success, frame = cap.read()
+        cap.release()
+        if not success or start not in sequential or \
+                not np.array_equal(frame, sequential[start]):
+            seek_mismatches.append(start)
+
+    # 2. 3D座標の比較
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        single = MotionCapture(
+            **parallel.capture_options
+        ).process_video(video_path, Path(tmp_dir) / "single.json", visualize=False)
+    multi = parallel.run(video_path)
+
+    single_landmarks, single_valid = landmarks_to_array(single["frames"])
+    multi_landmarks, multi_valid = landmarks_to_array(multi["frames"])
+    common = sorted(set(single_valid) & set(multi_valid))
+    errors = np.linalg.norm(
+        single_landmarks[common] - multi_landmarks[common], axis=2
+    ).mean(axis=1) if common else np.zeros(0)
+
+    # 区間の境目から warmup_frames 以内のフレーム
+    boundaries = np.array([output_start for _, output_start, _ in frame_ranges[1:]])
+    common = np.asarray(common, dtype=np.int64)
+    near_boundary = np.zeros(len(common), dtype=bool)
+    for boundary in boundaries:
+        near_boundary |= (common >= boundary) & (common < boundary + warmup_frames)
+
+    def summarize(values: np.ndarray) -> Optional[dict]:
+        if len(values) == 0:
+            return None
+        return {"mean": float(values.mean()), "max": float(values.max())}
+
+    report = {
+        "num_frames": {"single": len(single["frames"]), "parallel": len(multi["frames"])},
+        "seek_mismatches": seek_mismatches,
+        "detection_mismatches": sorted(set(single_valid) ^ set(multi_valid)),
+        "error": summarize(errors),
+        "error_near_boundary": summarize(errors[near_boundary]),
+        "error_elsewhere": summarize(errors[~near_boundary]),
+    }
+
+    print(f"\n並列モードと1プロセスの比較 ({num_workers}プロセス, "
+          f"ウォームアップ {warmup_frames}フレーム):")
+    print(f"  - フレーム数: 1プロセス {report['num_frames']['single']}, "
+          f"並列 {report['num_frames']['parallel']}")
+    print(f"  - シーク位置のずれ: {seek_mismatches or 'なし'}")
+    print(f"  - 検出の有無が違うフレーム数: {len(report['detection_mismatches'])}")
+    for label, key in (("全体", "error"), ("区間の境目の直後", "error_near_boundary"),
+                       ("それ以外", "error_elsewhere")):
+        if report[key]:
+            print(f"  - 座標の差（{label}）: 平均 {report[key]['mean'] * 100:.3f} cm, "
+                  f"最大 {report[key]['max'] * 100:.3f} cm")
+
+    return report
+
+
+def _measure_range_overhead(video_path: str, frame_ranges) -> dict:
+    """
+    ベンチマーク用: 区間に分けることで増える処理（シークとウォームアップのデコード）を計測
+
+    Args:
+        video_path: 入力動画のパス
+        frame_ranges: split_frame_ranges の戻り値
+
+    Returns:
+        シークの秒数、ウォームアップのフレーム数とデコードの秒数を含む辞書
+    """
+    seek_seconds = 0.0
+    warmup_seconds = 0.0
+    warmup_frames = 0
+
+    for decode_start, output_start, _ in frame_ranges:
+        if decode_start == 0 and output_start == 0:
+            continue
+
+        start_time = time.perf_counter()
+        cap = open_video_at(video_path, decode_start)
+        seek_time = time.perf_counter()
+        for _ in range(output_start - decode_start):
+            success, _ = cap.read()
+            if not success:
+                break
+            warmup_frames += 1
+        cap.release()
+
+        seek_seconds += seek_time - start_time
+        warmup_seconds += time.perf_counter() - seek_time
+
+    return {
+        "seek_seconds": seek_seconds,
+        "warmup_frames": warmup_frames,
+        "warmup_seconds": warmup_seconds,
+    }
+
+
+def _run_single_process(video_path: str, capture_options: Optional[dict] = None
+                        ) -> Tuple[int, Optional[float], Optional[float]]:
+    """
+    ベンチマーク用: 1プロセスでデコードしてRGBに変換する（姿勢推定も行う場合あり）
+
+    Args:
+        video_path: 入力動画のパス
+        capture_options: MotionCapture に渡す引数（Noneの場合は推定しない）
+
+    Returns:
+        (フレーム数, 最初のフレームの処理が終わった時刻, 最後のフレームの時刻)
+    """
+    mc = None
+    if capture_options is not None:
+        from motion_capture import MotionCapture
+        mc = MotionCapture(**capture_options)
+
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    count = 0
+    first_frame_time = last_frame_time = None
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if mc is not None:
+            results, model_complexity = mc.estimate_pose(frame_rgb)
+            mc.create_frame_data(count, fps, results, model_complexity)
+        count += 1
+        last_frame_time = time.perf_counter()
+        if first_frame_time is None:
+            first_frame_time = last_frame_time
+    cap.release()
+
+    return count, first_frame_time, last_frame_time
+
+
+def benchmark(video_path: str, num_workers: int = 2,
+              num_slots: int = DEFAULT_NUM_SLOTS,
+              warmup_frames: int = DEFAULT_WARMUP_FRAMES, inference: bool = True,
+              adaptive: bool = False, light_complexity: int = 1,
+              visibility_threshold: float = 0.5, recovery_frames: int = 5) -> dict:
+    """
+    1プロセスのループと並列モードの処理速度を比較して表示
+
+    フレームの受け渡しだけの速度（デコード + RGB変換）を
+    1プロセス / 共有メモリのリングバッファ / pickleベースのキュー で比較し、
+    inference=True の場合は姿勢推定を含めた速度も比較します。
+    共有メモリとpickleの比較は、同じ区間分け・ウォームアップなしのパイプラインで
+    受け渡し方法だけを変えて行います。区間に分けることで増えるシークと
+    ウォームアップのデコードの時間は、別に計測して表示します。
+    各方式とも、起動時間（プロセス生成・モデルの読み込み・最初のフレーム）と
+    定常状態の処理速度を分けて計測します。
+    帯域は定常状態でのフレームデータ量 (height×width×3 バイト) × フレーム数 / 秒 です。
+
+    並列化の効果はCPUのコア数に依存します。コア数が プロセス数 より少ない環境では
+    並列モードの方が遅くなります。
+
+    Args:
+        video_path: 入力動画のパス
+        num_workers: パイプラインの数
+        num_slots: パイプラインごとのスロット数
+        warmup_frames: 姿勢推定を含めた比較でのウォームアップのフレーム数
+        inference: 姿勢推定を含めた比較も行うか
+        adaptive: 姿勢推定に適応モードを使うか
+        light_complexity: 適応モードで通常使うモデル（0 または 1）
+        visibility_threshold: 重いモデルに切り替える平均visibilityの閾値
+        recovery_frames: 軽いモデルに戻すまでに必要な連続フレーム数
+
+    Returns:
+        各方式の起動時間、定常状態の fps と帯域 (GB/s)、
+        区間分けのオーバーヘッド（"range_overhead"）を含む辞書
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    frame_bytes = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) * \
+        int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3
+    cap.release()
+
+    parallel = ParallelMotionCapture(
+        num_workers=num_workers, num_slots=num_slots,
+        warmup_frames=warmup_frames, adaptive=adaptive,
+        light_complexity=light_complexity,
+        visibility_threshold=visibility_threshold,
+        recovery_frames=recovery_frames
+    )
+
+    def with_bandwidth(timing: dict) -> dict:
+        timing["gb_per_second"] = timing["steady_fps"] * frame_bytes / 1e9
+        return timing
+
+    def measure(run) -> dict:
+        start_time = time.perf_counter()
+        count, first_frame_time, last_frame_time = run()
+        return with_bandwidth(
+            measure_timing(count, start_time, first_frame_time, last_frame_time)
+        )
+
+    def measure_parallel(parallel: ParallelMotionCapture, inference: bool,
+                         pickle_frames: bool = False) -> dict:
+        results_data = parallel.run(
+            video_path, inference=inference, pickle_frames=pickle_frames
+        )
+        processing = results_data["metadata"]["processing"]
+        return with_bandwidth({
+            "frames": len(results_data["frames"]),
+            "startup_seconds": processing["startup_seconds"],
+            "steady_fps": processing["steady_frames_per_second"],
+        })
+
+    # 受け渡し方法だけが違うように、どちらもウォームアップなしで同じ区間に分ける
+    transport = ParallelMotionCapture(
+        num_workers=num_workers, num_slots=num_slots, warmup_frames=0
+    )
+    results = {
+        "single_process": measure(lambda: _run_single_process(video_path)),
+        "shared_memory": measure_parallel(transport, inference=False),
+        "pickle_queue": measure_parallel(transport, inference=False, pickle_frames=True),
+    }
+
+    if inference:
+        results["single_process_inference"] = measure(
+            lambda: _run_single_process(video_path, parallel.capture_options)
+        )
+        results["parallel_inference"] = measure_parallel(parallel, inference=True)
+
+    cap = cv2.VideoCapture(str(video_path))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    range_overhead = _measure_range_overhead(
+        video_path,
+        split_frame_ranges(frame_count, num_workers, parallel.warmup_frames)
+    )
+
+    cpu_count = os.cpu_count() or 1
+    print(f"\n並列モードのベンチマーク ({num_workers}区間, {num_slots}スロット, "
+          f"CPUコア数 {cpu_count}):")
+    for name, result in results.items():
+        print(f"  - {name}: 起動 {result['startup_seconds']:.2f}秒, "
+              f"定常 {result['steady_fps']:.1f} fps, "
+              f"{result['gb_per_second']:.2f} GB/s")
+    print(f"  - 区間分けのオーバーヘッド（推定なし、1プロセスで計測）: "
+          f"シーク {range_overhead['seek_seconds']:.3f}秒, "
+          f"ウォームアップ {range_overhead['warmup_frames']}フレームのデコード "
+          f"{range_overhead['warmup_seconds']:.3f}秒")
+    if cpu_count < 2 * num_workers:
+        print(f"  ※ CPUコア数がプロセス数（{2 * num_workers}）より少ないため、"
+              f"並列化の効果はこの環境では計測できません")
+
+    results["range_overhead"] = range_overhead
+
+    return results
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description='デコードと姿勢推定を複数プロセスで行う3Dモーションキャプチャ'
+    )
+    parser.add_argument(
+        '-i', '--input',
+        required=True,
+        help='入力動画のパス'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        default=None,
+        help='出力JSONファイルのパス（デフォルト: output/<動画名>_3d_coords.json）'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=2,
+        help='動画を分ける区間の数（区間ごとにデコード・推定プロセスを起動、デフォルト: 2）'
+    )
+    parser.add_argument(
+        '--slots',
+        type=int,
+        default=DEFAULT_NUM_SLOTS,
+        help=f'区間ごとの共有メモリのフレームスロット数（デフォルト: {DEFAULT_NUM_SLOTS}）'
+    )
+    parser.add_argument(
+        '--warmup-frames',
+        type=int,
+        default=DEFAULT_WARMUP_FRAMES,
+        help='区間の手前から推定を始めて結果を捨てるフレーム数'
+             f'（デフォルト: {DEFAULT_WARMUP_FRAMES}）'
+    )
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='軽いモデルで推定し、信頼度が低いフレームだけ重いモデルを使う'
+    )
+    parser.add_argument(
+        '--light-complexity',
+        type=int,
+        choices=[0, 1],
+        default=1,
+        help='適応モードで通常使うモデル（デフォルト: 1）'
+    )
+    parser.add_argument(
+        '--visibility-threshold',
+        type=float,
+        default=0.5,
+        help='重いモデルに切り替える平均visibilityの閾値（デフォルト: 0.5）'
+    )
+    parser.add_argument(
+        '--recovery-frames',
+        type=int,
+        default=5,
+        help='重いモデルで連続してこのフレーム数だけ信頼度が回復したら'
+             '軽いモデルに戻す（デフォルト: 5）'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='1プロセスの motion_capture.py の結果と比較する'
+    )
+    parser.add_argument(
+        '--benchmark',
+        action='store_true',
+        help='1プロセスのループと起動時間・定常状態の処理速度・帯域を比較する'
+    )
+    parser.add_argument(
+        '--skip-inference',
+        action='store_true',
+        help='ベンチマークでフレームの受け渡しだけを計測する'
+    )
+
+    args = parser.parse_args()
+
+    if args.verify:
+        verify(
+            video_path=args.input,
+            num_workers=args.workers,
+            num_slots=args.slots,
+            warmup_frames=args.warmup_frames,
+            adaptive=args.adaptive,
+            light_complexity=args.light_complexity,
+            visibility_threshold=args.visibility_threshold,
+            recovery_frames=args.recovery_frames
+        )
+        return
+
+    if args.benchmark:
+        benchmark(
+            video_path=args.input,
+            num_workers=args.workers,
+            num_slots=args.slots,
+            warmup_frames=args.warmup_frames,
+            inference=not args.skip_inference,
+            adaptive=args.adaptive,
+            light_complexity=args.light_complexity,
+            visibility_threshold=args.visibility_threshold,
+            recovery_frames=args.recovery_frames
+        )
+        return
+
+    parallel = ParallelMotionCapture(
+        num_workers=args.workers,
+        num_slots=args.slots,
+        warmup_frames=args.warmup_frames,
+        adaptive=args.adaptive,
+        light_complexity=args.light_complexity,
+        visibility_threshold=args.visibility_threshold,
+        recovery_frames=args.recovery_frames
+    )
+    parallel.process_video(video_path=args.input, output_path=args.output)
+
+
+if __name__ == "__main__":
+    main()
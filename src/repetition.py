@@ -0,0 +1,350 @@
+"""
+反復動作の解析スクリプト
+
+スクワットなどの反復動作について、膝の角度の時系列からレップ数・各レップの時間・
+最下点の姿勢を求めます。フレームを1つずつ（またはまとめて）渡すと、
+下降開始・最下点・上昇開始・レップ完了のイベントが確定した時点で返します。
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from utils import (
+    calculate_joint_angle_series,
+    get_major_joint_angles,
+    landmarks_to_array,
+)
+
+
+class RepetitionAnalyzer:
+    """関節角度にもとづく反復動作のインクリメンタル解析クラス"""
+
+    def __init__(self, fps: float,
+                 joints: Sequence[str] = ("left_knee", "right_knee"),
+                 min_depth: float = 30.0,
+                 return_tolerance: float = 10.0,
+                 smoothing: float = 0.5):
+        """
+        初期化
+
+        Args:
+            fps: フレームレート
+            joints: 動作の深さを表す関節名（get_major_joint_angles の名前）。
+                    これらの角度の平均を解析に使う
+            min_depth: 下降・上昇と判定する角度の変化量（度）。
+                       直前の最大値からこれ以上下がったら下降、最小値からこれ以上
+                       上がったら上昇とみなす
+            return_tolerance: 開始時の角度からこの範囲内に戻ったらレップ完了とみなす（度）
+            smoothing: 指数移動平均の係数（0〜1、1でスムージングなし）
+        """
+        self.fps = fps
+        self.min_depth = min_depth
+        self.return_tolerance = return_tolerance
+        self.smoothing = smoothing
+
+        self.joint_definitions = get_major_joint_angles()
+        self.joint_names = [definition[3] for definition in self.joint_definitions]
+        self.triplets = [definition[:3] for definition in self.joint_definitions]
+
+        unknown = [name for name in joints if name not in self.joint_names]
+        if unknown:
+            raise ValueError(f"未定義の関節です: {unknown}")
+        self.signal_indices = [self.joint_names.index(name) for name in joints]
+
+        self.reset()
+
+    def reset(self) -> None:
+        """解析の状態を初期化（レップの記録も消去）"""
+        self.reps = []
+        self.phase = "top"
+        self._smoothed = None
+        # 現在の区間での極値（フレーム番号, 角度, 全関節の角度）
+        self._extreme_frame = None
+        self._extreme_value = None
+        self._extreme_angles = None
+        # 進行中のレップの開始・最下点
+        self._rep_start = None
+        self._rep_bottom = None
+
+    def update(self, frame_idx: int, landmarks: np.ndarray) -> List[Dict]:
+        """
+        1フレーム分のランドマークで解析を進める
+
+        Args:
+            frame_idx: フレーム番号
+            landmarks: (landmarks, 3) の形状の配列
+
+        Returns:
+            このフレームで確定したイベントのリスト
+        """
+        angles = calculate_joint_angle_series(landmarks[None], self.triplets)[0]
+        value = float(np.mean(angles[self.signal_indices]))
+
+        return self._step(frame_idx, value, angles)
+
+    def update_frame(self, frame_data: dict) -> List[Dict]:
+        """
+        motion_capture.py のフレームデータで解析を進める
+
+        Args:
+            frame_data: "frame_index" と "landmarks_3d" を含む辞書
+
+        Returns:
+            このフレームで確定したイベントのリスト（ランドマークがない場合は空）
+        """
+        if not frame_data["landmarks_3d"]:
+            return []
+
+        landmarks = np.array(
+            [[lm["x"], lm["y"], lm["z"]] for lm in frame_data["landmarks_3d"]]
+        )
+
+        return self.update(frame_data["frame_index"], landmarks)
+
+    def update_chunk(self, landmarks_sequence: np.ndarray, start_frame: int = 0,
+                     valid_frames: Sequence[int] = None) -> List[Dict]:
+        """
+        複数フレームをまとめて解析を進める（角度の計算をベクトル化）
+
+        Args:
+            landmarks_sequence: (frames, landmarks, 3) の形状の配列
+            start_frame: 先頭フレームのフレーム番号
+            valid_frames: 有効なフレームの、このチャンク内でのインデックス
+                          （Noneの場合は全フレームが有効）
+
+        Returns:
+            このチャンクで確定したイベントのリスト
+        """
+        angles = calculate_joint_angle_series(landmarks_sequence, self.triplets)
+        values = np.mean(angles[:, self.signal_indices], axis=1).tolist()
+        if valid_frames is None:
+            valid_frames = range(len(landmarks_sequence))
+
+        events = []
+        for idx in valid_frames:
+            idx = int(idx)
+            events.extend(self._step(start_frame + idx, values[idx], angles[idx]))
+
+        return events
+
+    def _step(self, frame_idx: int, value: float, angles: np.ndarray) -> List[Dict]:
+        """
+        1フレーム分の状態遷移（O(1)）
+
+        Args:
+            frame_idx: フレーム番号
+            value: 動作の深さを表す角度（joints で指定した関節の平均）
+            angles: 全関節の角度 (joints,)
+
+        Returns:
+            このフレームで確定したイベントのリスト
+        """
+        if value != value:  # NaN（関節点が重なって角度が計算できない）
+            return []
+
+        # 指数移動平均でノイズを抑える
+        if self._smoothed is None:
+            self._smoothed = value
+        else:
+            self._smoothed += self.smoothing * (value - self._smoothed)
+        value = self._smoothed
+
+        if self._extreme_value is None:
+            self._set_extreme(frame_idx, value, angles)
+            return []
+
+        events = []
+
+        if self.phase in ("top", "ascent"):
+            if value >= self._extreme_value:
+                self._set_extreme(frame_idx, value, angles)
+
+            if self.phase == "ascent" and \
+                    value >= self._rep_start[1] - self.return_tolerance:
+                # 開始時の角度付近まで戻ったらレップ完了
+                events.append(self._complete_rep(frame_idx))
+                self.phase = "top"
+            elif value <= self._extreme_value - self.min_depth:
+                if self.phase == "ascent":
+                    # 戻りきらずに次の下降に入った場合は、上昇中の最大値でレップ完了
+                    events.append(self._complete_rep(self._extreme_frame))
+                # 直前の最大値から十分下がったので、最大値の時点から下降開始
+                self._rep_start = (self._extreme_frame, self._extreme_value)
+                events.append(self._event("descent", self._extreme_frame))
+                self.phase = "descent"
+                self._set_extreme(frame_idx, value, angles)
+
+        elif self.phase == "descent":
+            if value <= self._extreme_value:
+                self._set_extreme(frame_idx, value, angles)
+            elif value >= self._extreme_value + self.min_depth:
+                # 最小値から十分上がったので、最小値の時点が最下点
+                self._rep_bottom = (
+                    self._extreme_frame, self._extreme_value, self._extreme_angles
+                )
+                events.append(self._event(
+                    "bottom",
+                    self._extreme_frame,
+                    angle=self._extreme_value,
+                    joint_angles=dict(zip(
+                        self.joint_names, self._extreme_angles.tolist()
+                    )),
+                ))
+                events.append(self._event("ascent", self._extreme_frame))
+                self.phase = "ascent"
+                self._set_extreme(frame_idx, value, angles)
+
+        return events
+
+    def _set_extreme(self, frame_idx: int, value: float, angles: np.ndarray) -> None:
+        """現在の区間の極値を更新"""
+        self._extreme_frame = frame_idx
+        self._extreme_value = value
+        self._extreme_angles = angles
+
+    def _event(self, event_type: str, frame_idx: int, **fields) -> Dict:
+        """イベントの辞書を作成"""
+        event = {
+            "type": event_type,
+            "frame_index": frame_idx,
+            "timestamp": frame_idx / self.fps,
+        }
+        event.update(fields)
+        return event
+
+    def _complete_rep(self, end_frame: int) -> Dict:
+        """
+        進行中のレップを完了として記録
+
+        Args:
+            end_frame: レップが終わったフレーム番号
+
+        Returns:
+            レップ完了のイベント
+        """
+        start_frame = self._rep_start[0]
+        bottom_frame, bottom_angle, bottom_angles = self._rep_bottom
+        rep = {
+            "rep_index": len(self.reps),
+            "start_frame": start_frame,
+            "bottom_frame": bottom_frame,
+            "end_frame": end_frame,
+            "duration": (end_frame - start_frame) / self.fps,
+            "descent_duration": (bottom_frame - start_frame) / self.fps,
+            "ascent_duration": (end_frame - bottom_frame) / self.fps,
+            "bottom_angle": bottom_angle,
+            "bottom_joint_angles": dict(zip(self.joint_names, bottom_angles.tolist())),
+        }
+        self.reps.append(rep)
+
+        return self._event("rep", end_frame, **rep)
+
+    def summary(self) -> Dict:
+        """
+        これまでに完了したレップのまとめ
+
+        Returns:
+            レップ数・平均時間・各レップの情報を含む辞書
+        """
+        durations = [rep["duration"] for rep in self.reps]
+        return {
+            "rep_count": len(self.reps),
+            "mean_duration": float(np.mean(durations)) if durations else None,
+            "reps": self.reps,
+        }
+
+
+def analyze_capture(json_path: str, chunk_size: int = 10000, **options) -> Dict:
+    """
+    保存済みのJSONファイルをまとめて解析
+
+    Args:
+        json_path: motion_capture.py が出力したJSONファイルのパス
+        chunk_size: 一度に角度を計算するフレーム数
+        **options: RepetitionAnalyzer に渡す引数
+
+    Returns:
+        summary の戻り値にイベントのリストと処理速度を加えた辞書
+    """
+    json_path = Path(json_path)
+    if not json_path.exists():
+        raise FileNotFoundError(f"JSONファイルが見つかりません: {json_path}")
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    landmarks_sequence, valid_frames = landmarks_to_array(data["frames"])
+    valid_frames = np.asarray(valid_frames, dtype=np.int64)
+
+    analyzer = RepetitionAnalyzer(fps=data["metadata"]["fps"], **options)
+    events = []
+
+    start_time = time.perf_counter()
+    for start in range(0, len(landmarks_sequence), chunk_size):
+        stop = start + chunk_size
+        chunk_valid = valid_frames[(valid_frames >= start) & (valid_frames < stop)]
+        events.extend(analyzer.update_chunk(
+            landmarks_sequence[start:stop], start, chunk_valid - start
+        ))
+    elapsed = time.perf_counter() - start_time
+
+    result = analyzer.summary()
+    result["events"] = events
+    result["frames_per_second"] = len(landmarks_sequence) / elapsed if elapsed > 0 else 0.0
+
+    return result
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description="3D座標データからスクワットなどのレップ数と各フェーズを解析"
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="入力JSONファイルのパス（motion_capture.pyの出力）",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="出力JSONファイルのパス（デフォルト: output/<動画名>_reps.json）",
+    )
+    parser.add_argument(
+        "--min-depth",
+        type=float,
+        default=30.0,
+        help="下降・上昇と判定する膝の角度の変化量（度、デフォルト: 30）",
+    )
+
+    args = parser.parse_args()
+
+    result = analyze_capture(args.input, min_depth=args.min_depth)
+
+    if args.output is None:
+        stem = Path(args.input).stem.replace("_3d_coords", "")
+        output_path = Path("output") / f"{stem}_reps.json"
+    else:
+        output_path = Path(args.output)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    print(f"\nレップ解析完了!")
+    print(f"  - レップ数: {result['rep_count']}")
+    for rep in result["reps"]:
+        print(f"    {rep['rep_index'] + 1}回目: {rep['duration']:.2f}秒 "
+              f"(最下点の膝角度 {rep['bottom_angle']:.1f}度)")
+    print(f"  - 処理速度: {result['frames_per_second']:.0f} フレーム/秒")
+    print(f"  - 出力ファイル: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
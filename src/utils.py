@@ -139,6 +139,60 @@ def calculate_joint_angles(landmarks: np.ndarray,
     return angles
 
 
+def calculate_joint_angle_series(landmarks_sequence: np.ndarray,
+                                 joint_triplets: List[Tuple[int, int, int]]) -> np.ndarray:
+    """
+    関節角度の時系列を一括で計算
+
+    calculate_joint_angles を全フレームに対してベクトル化したものです。
+
+    Args:
+        landmarks_sequence: (frames, landmarks, 3) の形状の配列
+        joint_triplets: 関節を定義する3点のインデックスのリスト
+                       [(point1, joint, point2), ...]
+
+    Returns:
+        関節角度（度数法）の配列 (frames, joints)
+    """
+    p1_idx, joint_idx, p2_idx = (list(idx) for idx in zip(*joint_triplets))
+
+    # ベクトルを計算
+    v1 = landmarks_sequence[:, p1_idx] - landmarks_sequence[:, joint_idx]
+    v2 = landmarks_sequence[:, p2_idx] - landmarks_sequence[:, joint_idx]
+
+    # 内積を使って角度を計算
+    norms = np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_angle = np.einsum('fjc,fjc->fj', v1, v2) / norms
+    # 数値誤差対策
+    cos_angle = np.clip(cos_angle, -1.0, 1.0)
+
+    return np.degrees(np.arccos(cos_angle))
+
+
+def fill_undefined_frames(values: np.ndarray) -> np.ndarray:
+    """
+    値が定義されない（NaNの）フレームを直前の有効な値で埋める
+
+    先頭のNaNは最初の有効な値で埋めます。全フレームがNaNの列はNaNのままです。
+
+    Args:
+        values: (frames, columns) の形状の配列
+
+    Returns:
+        NaNを埋めた配列
+    """
+    defined = ~np.isnan(values)
+    frame_indices = np.arange(len(values))[:, None]
+
+    # 各フレームで直前の有効なフレーム（先頭は最初の有効なフレーム）を参照
+    last_defined = np.maximum.accumulate(np.where(defined, frame_indices, -1), axis=0)
+    first_defined = np.argmax(defined, axis=0)
+    source = np.where(last_defined >= 0, last_defined, first_defined[None, :])
+
+    return np.take_along_axis(values, source, axis=0)
+
+
 def calculate_velocity(landmarks_sequence: np.ndarray, fps: float) -> np.ndarray:
     """
     各ランドマークの速度を計算
@@ -189,6 +243,36 @@ def filter_low_confidence_landmarks(landmarks: List[Dict],
     return filtered
 
 
+def landmarks_to_array(frames: List[Dict],
+                       key: str = 'landmarks_3d') -> Tuple[np.ndarray, List[int]]:
+    """
+    フレームデータのリストをランドマーク座標配列に変換
+
+    Args:
+        frames: motion_capture.py が出力する "frames" のリスト
+        key: 使用する座標の種類（'landmarks_3d' または 'landmarks_2d'）
+
+    Returns:
+        (frames, 33, 3) の形状の配列と有効なフレームのインデックスリスト
+        （ランドマークが検出されなかったフレームはゼロ埋め）
+    """
+    num_landmarks = len(get_landmark_names())
+    landmarks_sequence = np.zeros((len(frames), num_landmarks, 3))
+    valid_frames = []
+
+    for frame_idx, frame in enumerate(frames):
+        landmarks = frame.get(key)
+        if not landmarks:
+            continue
+
+        landmarks_sequence[frame_idx] = [
+            [lm['x'], lm['y'], lm['z']] for lm in landmarks
+        ]
+        valid_frames.append(frame_idx)
+
+    return landmarks_sequence, valid_frames
+
+
 def get_landmark_names() -> List[str]:
     """
     MediaPipe Poseのランドマーク名リストを取得
@@ -10,8 +10,150 @@ import json
 import numpy as np
 import plotly.graph_objects as go
 from pathlib import Path
+from plotly.subplots import make_subplots
 from typing import List, Tuple
 
+from utils import (
+    calculate_joint_angle_series,
+    calculate_velocity,
+    fill_undefined_frames,
+    get_landmark_names,
+    get_major_joint_angles,
+    interpolate_missing_frames,
+    landmarks_to_array,
+)
+
+
+# ダッシュボードに埋め込む系列あたりの点数の上限（12系列で約10MBのHTML）
+DEFAULT_POINT_BUDGET = 50000
+
+
+# ダッシュボードのズーム時に表示範囲に合わせて解像度を切り替えるJavaScript
+# （{plot_id} は Plotly が埋め込み先のdivのIDに置き換える）
+DASHBOARD_ZOOM_SCRIPT = """
+const gd = document.getElementById("{plot_id}");
+const pyramids = JSON.parse(document.getElementById("dashboard-levels").textContent);
+const fps = pyramids.fps;
+const budget = pyramids.max_points;
+
+function lowerBound(array, value) {
+    let lo = 0, hi = array.length;
+    while (lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if (array[mid] < value) { lo = mid + 1; } else { hi = mid; }
+    }
+    return lo;
+}
+
+function updateResolution(start, stop) {
+    const xs = [], ys = [], indices = [];
+    pyramids.traces.forEach((levels, traceIdx) => {
+        // 表示範囲内の点数が予算を超えない、最も細かいレベルを選ぶ
+        let chosen = levels[0], lo = 0, hi = levels[0].x.length;
+        for (const level of levels) {
+            const levelLo = Math.max(lowerBound(level.x, start) - 1, 0);
+            const levelHi = Math.min(lowerBound(level.x, stop) + 1, level.x.length);
+            if (levelHi - levelLo > 2 * budget) { break; }
+            chosen = level; lo = levelLo; hi = levelHi;
+        }
+        xs.push(chosen.x.slice(lo, hi).map((frame) => frame / fps));
+        ys.push(chosen.y.slice(lo, hi));
+        indices.push(traceIdx);
+    });
+    Plotly.restyle(gd, {x: xs, y: ys}, indices);
+}
+
+gd.on("plotly_relayout", (event) => {
+    const start = event["xaxis.range[0]"] ?? event["xaxis2.range[0]"];
+    const stop = event["xaxis.range[1]"] ?? event["xaxis2.range[1]"];
+    if (start !== undefined && stop !== undefined) {
+        updateResolution(start * fps, stop * fps);
+    } else if (event["xaxis.autorange"] || event["xaxis2.autorange"]) {
+        updateResolution(-Infinity, Infinity);
+    }
+});
+"""
+
+
+def downsample_minmax(values: np.ndarray, num_buckets: int) -> np.ndarray:
+    """
+    min/maxバケットによる形状を保つ間引き
+
+    系列を num_buckets 個の区間に分け、各区間の最小値と最大値のインデックスを残します。
+    ピーク（スクワットの最下点など）が間引きで消えません。
+
+    Args:
+        values: 1次元の系列
+        num_buckets: 区間の数（出力は最大 2×num_buckets 点）
+
+    Returns:
+        残すインデックスの配列（昇順）
+    """
+    total = len(values)
+    if total <= 2 * num_buckets:
+        return np.arange(total)
+
+    bucket_size = int(np.ceil(total / num_buckets))
+    num_buckets = int(np.ceil(total / bucket_size))
+
+    # 最後の区間は末尾の値で埋めて同じ長さにそろえる
+    padded = np.empty(num_buckets * bucket_size, dtype=values.dtype)
+    padded[:total] = values
+    padded[total:] = values[-1]
+    buckets = padded.reshape(num_buckets, bucket_size)
+
+    offsets = np.arange(num_buckets) * bucket_size
+    indices = np.concatenate([
+        offsets + np.argmin(buckets, axis=1),
+        offsets + np.argmax(buckets, axis=1),
+        [0, total - 1],
+    ])
+
+    return np.unique(np.minimum(indices, total - 1))
+
+
+def build_resolution_levels(values: np.ndarray, max_points: int,
+                            point_budget: int) -> List[dict]:
+    """
+    ズームレベルごとの間引き系列（粗い順）を作成
+
+    レベルが1つ上がるごとに区間数を2倍にし、元の系列（間引きなし）に
+    達するまで続けます。ただし全レベルの合計点数が point_budget を
+    超えるレベルは作らないため、長い記録では最も細かいレベルでも
+    1区間に複数フレームがまとめられます（ズームの下限）。
+
+    Args:
+        values: 1次元の系列
+        max_points: 1画面に表示する区間数の目安
+        point_budget: 系列あたりの全レベルの合計点数の上限
+                      （最も粗いレベルは上限によらず必ず作る）
+
+    Returns:
+        各レベルの {"x": フレーム番号のリスト, "y": 値のリスト,
+        "frames_per_bucket": 1区間のフレーム数（間引きなしなら1）} のリスト
+    """
+    levels = []
+    total_points = 0
+    num_buckets = max_points
+
+    while True:
+        indices = downsample_minmax(values, num_buckets)
+        if levels and total_points + len(indices) > point_budget:
+            break
+
+        raw = len(indices) == len(values)
+        levels.append({
+            "x": indices.tolist(),
+            "y": np.round(values[indices], 2).tolist(),
+            "frames_per_bucket": 1 if raw else int(np.ceil(len(values) / num_buckets)),
+        })
+        total_points += len(indices)
+        if raw:
+            break
+        num_buckets *= 2
+
+    return levels
+
 
 class Visualizer3D:
     """3D座標データの可視化クラス"""
@@ -280,6 +422,128 @@ class Visualizer3D:
 
         return str(output_path)
 
+    def create_timeseries_dashboard(
+        self,
+        data: dict,
+        output_path: str = None,
+        max_points: int = 1000,
+        point_budget: int = DEFAULT_POINT_BUDGET,
+    ) -> str:
+        """
+        関節角度と関節速度の時系列ダッシュボードを生成
+
+        角度と速度は一度だけ計算し、ズームレベルごとにmin/maxバケットで間引いた
+        系列をHTMLに埋め込みます。ズームすると表示範囲に合った解像度の系列に
+        切り替わるため、長い記録でもファイルサイズと描画時間が一定に収まります。
+
+        Args:
+            data: 座標データを含む辞書
+            output_path: 出力HTMLファイルのパス
+            max_points: 1画面に表示する区間数の目安（系列あたり最大2倍の点数）
+            point_budget: 系列あたりの埋め込む点数の上限。記録が短ければ
+                          拡大すると全フレームを表示し、長ければ最も細かい
+                          レベルでも数フレームずつ間引いた表示になる
+
+        Returns:
+            出力ファイルのパス
+        """
+        if output_path is None:
+            output_path = (
+                Path("output")
+                / f"{Path(data['metadata']['video_name']).stem}_dashboard.html"
+            )
+        else:
+            output_path = Path(output_path)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        fps = data["metadata"]["fps"]
+        landmarks, valid_frames = landmarks_to_array(data["frames"])
+        if len(valid_frames) < len(data["frames"]):
+            landmarks = interpolate_missing_frames(landmarks, valid_frames)
+
+        # 関節角度（度）と、角度を定義する関節点の速さ（m/s）
+        joint_definitions = get_major_joint_angles()
+        angles = calculate_joint_angle_series(
+            landmarks, [definition[:3] for definition in joint_definitions]
+        )
+        joint_indices = [definition[1] for definition in joint_definitions]
+        speeds = np.linalg.norm(
+            calculate_velocity(landmarks[:, joint_indices], fps), axis=2
+        )
+
+        landmark_names = get_landmark_names()
+        # 計算できないフレームの角度は直前の値で埋める
+        # （一度も計算できない関節は表示しない）
+        angles = fill_undefined_frames(angles)
+        series = [
+            (1, f"{name} (角度)", angles[:, idx])
+            for idx, (_, _, _, name) in enumerate(joint_definitions)
+            if not np.isnan(angles[0, idx])
+        ] + [
+            (2, f"{landmark_names[joint_idx]} (速さ)", speeds[:, idx])
+            for idx, joint_idx in enumerate(joint_indices)
+        ]
+
+        fig = make_subplots(
+            rows=2,
+            cols=1,
+            shared_xaxes=True,
+            vertical_spacing=0.08,
+            subplot_titles=("関節角度", "関節の速さ"),
+        )
+
+        pyramids = {"fps": fps, "max_points": max_points, "traces": []}
+        zoom_floor = 1
+        for row, name, values in series:
+            levels = build_resolution_levels(values, max_points, point_budget)
+            pyramids["traces"].append(levels)
+            zoom_floor = max(zoom_floor, levels[-1]["frames_per_bucket"])
+
+            # 初期表示は全体を見渡す最も粗いレベル
+            fig.add_trace(
+                go.Scatter(
+                    x=np.array(levels[0]["x"]) / fps,
+                    y=levels[0]["y"],
+                    mode="lines",
+                    name=name,
+                ),
+                row=row,
+                col=1,
+            )
+
+        fig.update_xaxes(title_text="時間 (秒)", row=2, col=1)
+        fig.update_yaxes(title_text="角度 (度)", row=1, col=1)
+        fig.update_yaxes(title_text="速さ (m/s)", row=2, col=1)
+        fig.update_layout(
+            title=f"関節角度・速度ダッシュボード - {data['metadata']['video_name']}",
+            hovermode="x unified",
+        )
+
+        # 間引き系列はJSONとして埋め込み、ズーム時にJavaScriptで切り替える
+        levels_json = json.dumps(pyramids, separators=(",", ":"))
+        html = fig.to_html(include_plotlyjs=True, post_script=DASHBOARD_ZOOM_SCRIPT)
+        html = html.replace(
+            "<body>",
+            '<body>\n<script type="application/json" id="dashboard-levels">'
+            f"{levels_json}</script>",
+            1,
+        )
+
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(html)
+
+        print(f"\nダッシュボード生成完了!")
+        print(f"  - 出力ファイル: {output_path}")
+        if zoom_floor > 1:
+            print(f"  - 拡大時の最小単位: {zoom_floor}フレーム（min/maxで間引き）。"
+                  f"全フレームを表示するには --point-budget を増やしてください")
+        else:
+            print(f"  - 拡大すると全フレームを表示します")
+        print(f"  - ブラウザで開いて確認してください")
+
+        return str(output_path)
+
 
 def main():
     """メイン関数"""
@@ -307,12 +571,41 @@ def main():
         default=1,
         help="フレームスキップ数（大きいほど軽量、デフォルト: 1）",
     )
+    parser.add_argument(
+        "--dashboard",
+        action="store_true",
+        help="3Dアニメーションの代わりに関節角度・速度の時系列ダッシュボードを生成",
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=1000,
+        help="ダッシュボードで1画面に表示する点数の目安（デフォルト: 1000）",
+    )
+    parser.add_argument(
+        "--point-budget",
+        type=int,
+        default=DEFAULT_POINT_BUDGET,
+        help="ダッシュボードに埋め込む系列あたりの点数の上限。"
+        "合計点数がこれに収まる範囲で拡大時に全フレームまで表示し、"
+        "収まらない長い記録では最も細かい表示も数フレームずつ間引かれる"
+        f"（最小単位は実行時に表示、デフォルト: {DEFAULT_POINT_BUDGET}）",
+    )
 
     args = parser.parse_args()
 
     # 可視化実行
     visualizer = Visualizer3D()
     data = visualizer.load_data(args.input)
+
+    if args.dashboard:
+        visualizer.create_timeseries_dashboard(
+            data=data,
+            output_path=args.output,
+            max_points=args.max_points,
+            point_budget=args.point_budget,
+        )
+        return
     visualizer.create_3d_animation(
         data=data,
         output_path=args.output,